@@ -16,6 +16,12 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         return data
 
 
+class UserSummarySerializer(serializers.Serializer):
+    pending_invitations = serializers.IntegerField()
+    incoming_requests = serializers.IntegerField()
+    calendars_awaiting_availability = serializers.IntegerField()
+
+
 class UserSerializer(serializers.ModelSerializer):
     firstName = serializers.CharField(write_only=True, required=True)
     lastName = serializers.CharField(write_only=True, required=True)
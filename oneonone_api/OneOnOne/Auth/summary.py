@@ -0,0 +1,87 @@
+import time
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from Calendars.models import Calendar
+from Contacts.models import Contact
+from Invitations.models import Invitation
+from TimeSlots.models import TimeSlot
+
+# Counters are invalidated by the writes that move them, the timeout only bounds
+# how long a write made outside the API can leave them stale
+SUMMARY_CACHE_SECONDS = 60 * 60
+
+
+def summary_key(user_id):
+    return f"summary:{user_id}"
+
+
+def summary_version_key(user_id):
+    return f"summary-version:{user_id}"
+
+
+def summary_version(user_id):
+    """
+    The cache version the user's counters are stored under, moved on by every
+    invalidation. A version dropped from the cache starts again from the
+    clock, so it cannot land back on a version stored before.
+    """
+    key = summary_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def compute_summary(user):
+    return {
+        "pending_invitations": Invitation.objects.filter(
+            invitee=user, status="pending"
+        ).count(),
+        "incoming_requests": Contact.objects.filter(userB=user, status=2).count(),
+        "calendars_awaiting_availability": Calendar.objects.filter(
+            participants__user=user, is_finalized=False
+        )
+        .exclude(
+            Exists(TimeSlot.objects.filter(day__calendar=OuterRef("pk"), owner=user))
+        )
+        .count(),
+    }
+
+
+def get_summary(user):
+    """
+    The user's badge counters, from the cache when no write has touched them
+    since they were last computed.
+
+    The version is read before the counters are computed. Counters computed
+    from data a concurrent write then changed are stored under a version the
+    write's invalidation has already left behind, so they are never served.
+    """
+    version = summary_version(user.id)
+    summary = cache.get(summary_key(user.id), version=version)
+    if summary is None:
+        summary = compute_summary(user)
+        cache.set(summary_key(user.id), summary, SUMMARY_CACHE_SECONDS, version=version)
+    return summary
+
+
+def invalidate_summaries(user_ids):
+    """
+    Move the cached counters of user_ids to a new version once the current
+    transaction commits, so they are never recomputed from data about to be
+    rolled back or not yet visible.
+    """
+    keys = [summary_version_key(user_id) for user_id in set(user_ids)]
+    if keys:
+        transaction.on_commit(lambda: bump_summary_versions(keys))
+
+
+def bump_summary_versions(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Never read, or dropped, the next read starts a new version
+            pass
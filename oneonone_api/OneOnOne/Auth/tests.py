@@ -0,0 +1,50 @@
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+from Calendars.models import Calendar
+from Invitations.models import Invitation
+from .summary import compute_summary, get_summary, invalidate_summaries
+
+
+class SummaryTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="invitee")
+        self.creator = User.objects.create(username="creator")
+        self.calendar = Calendar.objects.create(
+            title="Summary", description="", creator=self.creator
+        )
+
+    def invite(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Invitation.objects.create(
+                calendar=self.calendar, invitee=self.user, inviter=self.creator
+            )
+            invalidate_summaries([self.user.id])
+
+    def test_cached_until_invalidated(self):
+        self.assertEqual(get_summary(self.user)["pending_invitations"], 0)
+        with self.assertNumQueries(0):
+            get_summary(self.user)
+        self.invite()
+        self.assertEqual(get_summary(self.user)["pending_invitations"], 1)
+
+    def test_stale_counters_stored_after_an_invalidation_are_not_served(self):
+        def compute_then_write(user):
+            # The counters are read, then a write commits and invalidates
+            # before they are stored
+            summary = compute_summary(user)
+            self.invite()
+            return summary
+
+        with mock.patch("Auth.summary.compute_summary", compute_then_write):
+            self.assertEqual(get_summary(self.user)["pending_invitations"], 0)
+        self.assertEqual(get_summary(self.user)["pending_invitations"], 1)
+
+    def test_endpoint(self):
+        self.invite()
+        self.client.force_authenticate(self.user)
+        response = self.client.get("/me/summary/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["pending_invitations"], 1)
@@ -1,4 +1,5 @@
-from .serializers import UserSerializer
+from .serializers import UserSerializer, UserSummarySerializer
+from .summary import get_summary
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -44,3 +45,20 @@ class RegisterUserAPIView(APIView):
                 {"message": "User created successfully"}, status=status.HTTP_201_CREATED
             )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@extend_schema_view(
+    get=extend_schema(
+        description=(
+            "Badge counters of the current user: pending invitations, incoming "
+            "friend requests and unfinalized calendars they have not given "
+            "any availability for yet"
+        ),
+        responses={200: UserSummarySerializer},
+    ),
+)
+class UserSummaryAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response(UserSummarySerializer(get_summary(request.user)).data)
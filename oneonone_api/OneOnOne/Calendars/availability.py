@@ -0,0 +1,138 @@
+from collections import defaultdict
+from datetime import time
+
+
+def to_minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def to_time(minutes):
+    return time(minutes // 60, minutes % 60)
+
+
+def sweep_day(slots):
+    """
+    Sweep the (owner, start_minute, end_minute) slots of a single day and
+    yield, in order, the contiguous segments between consecutive boundaries
+    as (start, end, members) tuples, where members is the frozenset of owners
+    free for the whole segment. Segments nobody is free for are skipped. Runs
+    in O(n log n) for n slots.
+    """
+    events = []
+    for owner, start, end in slots:
+        if start < end:
+            events.append((start, 1, owner))
+            events.append((end, -1, owner))
+    events.sort(key=lambda event: event[0])
+
+    segment = None
+    active = defaultdict(int)  # overlapping slots of the same owner count once
+    index = 0
+    while index < len(events):
+        minute = events[index][0]
+        while index < len(events) and events[index][0] == minute:
+            _, delta, owner = events[index]
+            active[owner] += delta
+            if not active[owner]:
+                del active[owner]
+            index += 1
+        if index < len(events):
+            next_minute = events[index][0]
+            members = frozenset(active)
+            if segment and segment[2] == members:
+                # Same people free on both sides of the boundary, extend
+                segment = (segment[0], next_minute, members)
+            else:
+                if segment and segment[2]:
+                    yield segment
+                segment = (minute, next_minute, members)
+    if segment and segment[2]:
+        yield segment
+
+
+def day_windows(slots, min_duration):
+    """
+    Return the maximal windows of a day as (start, end, members) tuples: for
+    the group free over each segment of the sweep, the longest stretch around
+    it the whole group stays free for. Windows shorter than min_duration
+    minutes are dropped.
+
+    Windows are built in the same pass as the sweep with a stack of the ones
+    still open, as [group, start, exact] where exact means some segment had
+    exactly that group. The open groups are nested, narrowest (and earliest)
+    at the bottom, so a segment only closes windows from the top of the stack,
+    which never holds more entries than there are participants.
+    """
+    windows = []
+    stack = []
+    end = None
+
+    def close(popped):
+        for group, window_start, exact in popped:
+            if exact and end - window_start >= min_duration:
+                windows.append((window_start, end, group))
+
+    for start, segment_end, members in sweep_day(slots):
+        if start != end:
+            # Nobody is free in between, every open window ends here
+            close(reversed(stack))
+            stack = []
+        popped = []
+        while stack and not stack[-1][0] <= members:
+            popped.append(stack.pop())
+        close(popped)
+        # What is left of the closed groups carries on, from their start
+        for group, window_start, _ in reversed(popped):
+            group &= members
+            if group and (not stack or stack[-1][0] != group):
+                stack.append([group, window_start, False])
+        if stack and stack[-1][0] == members:
+            stack[-1][2] = True
+        else:
+            stack.append([members, start, True])
+        end = segment_end
+    close(reversed(stack))
+    return windows
+
+
+def suggest_windows(days, timeslots, min_duration=30, limit=None):
+    """
+    Rank candidate meeting windows for a calendar.
+
+    days is an iterable of Day instances and timeslots an iterable of
+    (day_id, owner_username, start_time, end_time) tuples. Windows are ordered
+    by the number of free participants, then by the day's ranking, then by
+    length, and each one is returned as a dict ready for SuggestionSerializer.
+    """
+    slots_by_day = defaultdict(list)
+    for day_id, owner, start_time, end_time in timeslots:
+        slots_by_day[day_id].append(
+            (owner, to_minutes(start_time), to_minutes(end_time))
+        )
+
+    suggestions = []
+    for day in days:
+        for start, end, members in day_windows(slots_by_day[day.id], min_duration):
+            suggestions.append(
+                {
+                    "day_id": day.id,
+                    "date": day.date,
+                    "ranking": day.ranking,
+                    "start_time": to_time(start),
+                    "end_time": to_time(end),
+                    "duration": end - start,
+                    "available_count": len(members),
+                    "available_usernames": sorted(members),
+                }
+            )
+
+    suggestions.sort(
+        key=lambda s: (
+            -s["available_count"],
+            s["ranking"],
+            -s["duration"],
+            s["date"],
+            s["start_time"],
+        )
+    )
+    return suggestions[:limit] if limit else suggestions
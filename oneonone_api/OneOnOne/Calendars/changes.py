@@ -0,0 +1,92 @@
+from .models import Calendar, Day, Participant
+from TimeSlots.models import TimeSlot
+from Invitations.models import Invitation
+
+# Change log kinds and the response keys they are reported under
+LOGGED_KINDS = {
+    "day": "days",
+    "timeslot": "timeslots",
+    "participant": "participants",
+    "invitation": "invitations",
+}
+
+
+def logged_objects(calendar, kind):
+    if kind == "day":
+        return Day.objects.filter(calendar=calendar)
+    if kind == "timeslot":
+        return TimeSlot.objects.filter(day__calendar=calendar).select_related("owner")
+    if kind == "participant":
+        return Participant.objects.filter(calendar=calendar).select_related("user")
+    return Invitation.objects.filter(calendar=calendar).select_related(
+        "inviter", "invitee"
+    )
+
+
+def change_log(calendar, since):
+    """The change log entries of calendar after version since, oldest first."""
+    return calendar.changes.filter(version__gt=since).order_by("version", "id")
+
+
+def changes_since(calendar, since):
+    """
+    Collect what changed in calendar after version since from its change log,
+    as a dict ready for CalendarChangesSerializer. Each object touched is
+    reported once, in its current state or among the deleted ids, so the
+    cost follows the number of changes and not the size of the calendar.
+
+    When the log does not reach back to since, reset is set and the client
+    has to refetch the whole calendar.
+
+    calendar is read before the log, so every version up to its own is
+    already in the rows read. The version returned is the newest of the two,
+    never one whose rows were not seen.
+    """
+    result = {
+        "version": calendar.version,
+        "reset": False,
+        "calendar": None,
+        "deleted": {key: [] for key in LOGGED_KINDS.values()},
+        **{key: [] for key in LOGGED_KINDS.values()},
+    }
+    if since < calendar.changes_start or since > calendar.version:
+        result["reset"] = True
+        return result
+
+    # Later entries win, an object deleted after an update is only deleted
+    latest = {}
+    for version, kind, object_id, deleted in change_log(calendar, since).values_list(
+        "version", "kind", "object_id", "deleted"
+    ):
+        latest[kind, object_id] = deleted
+        result["version"] = max(result["version"], version)
+    # Pruned while the rows were read, they may be missing some
+    if Calendar.objects.filter(pk=calendar.pk, changes_start__gt=since).exists():
+        result["version"] = calendar.version
+        result["reset"] = True
+        return result
+
+    if latest.pop(("calendar", calendar.pk), None) is not None:
+        # Edited again since it was read, report the edit the version covers
+        if result["version"] > calendar.version:
+            calendar.refresh_from_db()
+        result["calendar"] = calendar
+    for kind, key in LOGGED_KINDS.items():
+        object_ids = {
+            object_id
+            for (logged_kind, object_id), deleted in latest.items()
+            if logged_kind == kind and not deleted
+        }
+        deleted_ids = {
+            object_id
+            for (logged_kind, object_id), deleted in latest.items()
+            if logged_kind == kind and deleted
+        }
+        if object_ids:
+            result[key] = list(
+                logged_objects(calendar, kind).filter(pk__in=object_ids).order_by("pk")
+            )
+            # Gone without a log entry of its own, e.g. through a cascade
+            deleted_ids |= object_ids - {obj.pk for obj in result[key]}
+        result["deleted"][key] = sorted(deleted_ids)
+    return result
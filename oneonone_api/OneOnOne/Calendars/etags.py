@@ -0,0 +1,35 @@
+import hashlib
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+class ETagMixin:
+    """
+    Answer GET with an ETag, and with 304 Not Modified when the client's
+    If-None-Match already matches it, without serializing anything.
+
+    Views implement get_etag_state() to return a cheap fingerprint of what
+    the response depends on (usually calendar versions), or None to skip
+    conditional handling.
+    """
+
+    def get_etag_state(self):
+        raise NotImplementedError
+
+    def get_etag(self, request):
+        state = self.get_etag_state()
+        if state is None:
+            return None
+        key = f"{request.user.pk}|{request.get_full_path()}|{state}"
+        return quote_etag(hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        if etag and etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = super().get(request, *args, **kwargs)
+        if etag and response.status_code in (200, 304):
+            response["ETag"] = etag
+        return response
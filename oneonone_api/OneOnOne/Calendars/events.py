@@ -0,0 +1,67 @@
+import asyncio
+import threading
+from collections import defaultdict
+from functools import lru_cache
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class InProcessBackend:
+    """
+    Deliver calendar events to the long-polls waiting in this process. Writes
+    publish from worker threads and each poll waits on an asyncio queue in
+    the event loop serving it.
+
+    With several server processes, point CALENDAR_EVENTS_BACKEND at a backend
+    sharing events between them (e.g. over Redis pub/sub) that implements the
+    same publish, subscribe and unsubscribe methods.
+    """
+
+    # Events a listener can fall behind by before new ones are dropped, it
+    # catches up through the changes endpoint
+    queue_size = 100
+
+    def __init__(self):
+        self.listeners = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def publish(self, calendar_id, event):
+        with self.lock:
+            listeners = list(self.listeners.get(calendar_id, ()))
+        for loop, queue in listeners:
+            try:
+                loop.call_soon_threadsafe(deliver, queue, event)
+            except RuntimeError:
+                # The listener's loop already closed
+                pass
+
+    def subscribe(self, calendar_id):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self.lock:
+            self.listeners[calendar_id].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, calendar_id, queue):
+        with self.lock:
+            listeners = self.listeners.get(calendar_id, set())
+            listeners.difference_update(
+                [listener for listener in listeners if listener[1] is queue]
+            )
+            if not listeners:
+                self.listeners.pop(calendar_id, None)
+
+
+def deliver(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        pass
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    return import_string(settings.CALENDAR_EVENTS_BACKEND)()
+
+
+def publish(calendar_id, event):
+    get_backend().publish(calendar_id, event)
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from Calendars.query_plans import hot_queries, plan_problems, seed
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway dataset, run EXPLAIN QUERY PLAN on the hot queries of "
+        "the API and fail if any of them scans a table or sorts in a temp B-tree"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verbose-plans",
+            action="store_true",
+            help="Print the plan of every query, not only the failing ones",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Query plans can only be checked on SQLite.")
+
+        failures = []
+        try:
+            with transaction.atomic():
+                for name, queryset, allow_sort in hot_queries(*seed()):
+                    plan = queryset.explain()
+                    problems = plan_problems(plan, allow_sort)
+                    if problems:
+                        failures.append(name)
+                        self.stdout.write(self.style.ERROR(f"FAIL {name}"))
+                    else:
+                        self.stdout.write(f"ok   {name}")
+                    if problems or options["verbose_plans"]:
+                        self.stdout.write(plan)
+                # Nothing seeded may outlive the check
+                raise Rollback
+        except Rollback:
+            pass
+
+        if failures:
+            raise CommandError(
+                f"{len(failures)} queries need an index: " + ", ".join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS("Every hot query uses an index."))
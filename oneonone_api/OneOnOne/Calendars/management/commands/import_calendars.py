@@ -0,0 +1,41 @@
+import json
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from Calendars.serializers import create_calendar_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Create calendars in bulk from a JSON file holding a list of "
+        "{title, description, days: [{date, ranking}]} objects"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("username", help="User who will own the calendars")
+        parser.add_argument("path", help="JSON file to import")
+
+    def handle(self, *args, **options):
+        try:
+            creator = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']} does not exist.")
+        try:
+            with open(options["path"]) as file:
+                items = json.load(file)
+        except (OSError, ValueError) as error:
+            raise CommandError(f"Could not read {options['path']}: {error}")
+        if not isinstance(items, list):
+            raise CommandError("The file must contain a list of calendars.")
+
+        results = create_calendar_batch(creator, items)
+        created = 0
+        for result in results:
+            if "errors" in result:
+                self.stderr.write(
+                    f"Calendar {result['index']}: {json.dumps(result['errors'])}"
+                )
+            else:
+                created += 1
+        self.stdout.write(
+            self.style.SUCCESS(f"Created {created} of {len(results)} calendars.")
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Calendars', '0002_calendar_final_date_calendar_final_timeslot_end_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calendar',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
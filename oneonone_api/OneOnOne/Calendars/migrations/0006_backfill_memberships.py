@@ -0,0 +1,31 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:23
+
+from django.db import migrations
+
+
+def backfill_memberships(apps, schema_editor):
+    Calendar = apps.get_model("Calendars", "Calendar")
+    Participant = apps.get_model("Calendars", "Participant")
+    Membership = apps.get_model("Calendars", "Membership")
+
+    memberships = {
+        (creator_id, calendar_id): "creator"
+        for calendar_id, creator_id in Calendar.objects.values_list("id", "creator_id")
+    }
+    for user_id, calendar_id in Participant.objects.values_list("user_id", "calendar_id"):
+        memberships.setdefault((user_id, calendar_id), "participant")
+    Membership.objects.bulk_create(
+        Membership(user_id=user_id, calendar_id=calendar_id, role=role)
+        for (user_id, calendar_id), role in memberships.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Calendars', '0005_membership'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_memberships, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+
+
+def start_change_logs(apps, schema_editor):
+    # Existing calendars have no history before their current version
+    Calendar = apps.get_model("Calendars", "Calendar")
+    Calendar.objects.update(changes_start=F("version"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Calendars', '0006_backfill_memberships'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calendar',
+            name='changes_start',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.RunPython(start_change_logs, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='CalendarChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('kind', models.CharField(choices=[('calendar', 'Calendar'), ('day', 'Day'), ('timeslot', 'Timeslot'), ('participant', 'Participant'), ('invitation', 'Invitation')], max_length=20)),
+                ('object_id', models.PositiveIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('calendar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='Calendars.calendar')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['calendar', 'version'], name='calendar_change_idx')],
+            },
+        ),
+    ]
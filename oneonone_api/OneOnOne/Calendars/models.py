@@ -1,5 +1,12 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
+from django.utils import timezone
+from .events import publish
+
+# Versions of history the change log keeps per calendar. A calendar is pruned
+# back to this once it holds twice as many, so writes rarely pay for it
+CHANGE_LOG_RETENTION = 500
 
 
 class Calendar(models.Model):
@@ -22,10 +29,111 @@ class Calendar(models.Model):
         null=True,
         blank=True,
     )  # Reference to a Timeslot model
+    # Bumped on every write to the calendar, its days, timeslots, participants
+    # and invitations, used to build ETags
+    version = models.PositiveIntegerField(default=1)
+    # Oldest version the change log can bring a client forward from
+    changes_start = models.PositiveIntegerField(default=1)
 
     class Meta:
         ordering = ["-updated_at"]
 
+    def save(self, *args, **kwargs):
+        # version only moves through bump_version, never write back a stale copy
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in ("version", "changes_start")
+            ]
+        super().save(*args, **kwargs)
+
+    def has_member(self, user):
+        return self.memberships.filter(user=user).exists()
+
+    @classmethod
+    def bump_version(cls, calendar_id, changed=None, deleted=None):
+        """
+        Move the calendar to a new version and log the {kind: ids} objects
+        changed and deleted by the write under it, for clients syncing through
+        the changes endpoint, then publish it to the calendar's live listeners.
+        """
+        cls.bump_versions({calendar_id: (changed, deleted)})
+
+    @classmethod
+    def bump_versions(cls, changes):
+        """
+        bump_version for many calendars at once, changes mapping each
+        calendar id to its (changed, deleted) objects. Uses one statement per
+        step whatever the number of calendars.
+        """
+        with transaction.atomic():
+            cls.objects.filter(pk__in=changes).update(
+                version=F("version") + 1, updated_at=timezone.now()
+            )
+            versions = {}
+            overgrown = []
+            for calendar_id, version, changes_start in cls.objects.filter(
+                pk__in=changes
+            ).values_list("id", "version", "changes_start"):
+                versions[calendar_id] = version
+                if version - changes_start >= 2 * CHANGE_LOG_RETENTION:
+                    overgrown.append(calendar_id)
+            if overgrown:
+                cls.prune_changes(overgrown)
+            CalendarChange.objects.bulk_create(
+                CalendarChange(
+                    calendar_id=calendar_id,
+                    version=versions[calendar_id],
+                    kind=kind,
+                    object_id=object_id,
+                    deleted=is_deleted,
+                )
+                for calendar_id, calendar_changes in changes.items()
+                if calendar_id in versions
+                for is_deleted, objects in zip((False, True), calendar_changes)
+                for kind, object_ids in (objects or {}).items()
+                for object_id in object_ids
+            )
+            events = {
+                calendar_id: {
+                    "version": versions[calendar_id],
+                    "changed": {
+                        kind: sorted(object_ids)
+                        for kind, object_ids in (changed or {}).items()
+                    },
+                    "deleted": {
+                        kind: sorted(object_ids)
+                        for kind, object_ids in (deleted or {}).items()
+                    },
+                }
+                for calendar_id, (changed, deleted) in changes.items()
+                if calendar_id in versions
+            }
+
+            # Listeners only hear about writes that made it to the database
+            def publish_events():
+                for calendar_id, event in events.items():
+                    publish(calendar_id, event)
+
+            transaction.on_commit(publish_events)
+
+    @classmethod
+    def prune_changes(cls, calendar_ids):
+        """
+        Drop the change log entries of calendar_ids older than their last
+        CHANGE_LOG_RETENTION versions, moving changes_start up so clients
+        behind it are told to reset instead of getting a partial delta.
+        """
+        with transaction.atomic():
+            cls.objects.filter(
+                pk__in=calendar_ids, version__gt=CHANGE_LOG_RETENTION
+            ).update(changes_start=F("version") - CHANGE_LOG_RETENTION)
+            CalendarChange.objects.filter(
+                calendar_id__in=calendar_ids, version__lte=F("calendar__changes_start")
+            ).delete()
+
 
 class Day(models.Model):
     calendar = models.ForeignKey(
@@ -52,3 +160,43 @@ class Participant(models.Model):
 
     class Meta:
         unique_together = ("user", "calendar")
+
+
+class Membership(models.Model):
+    # One row per user who can see a calendar, whether they created it or were
+    # added as a participant, so visibility is a single index lookup
+    ROLE_CHOICES = [("creator", "Creator"), ("participant", "Participant")]
+    user = models.ForeignKey(
+        User, related_name="calendar_memberships", on_delete=models.CASCADE
+    )
+    calendar = models.ForeignKey(
+        Calendar, related_name="memberships", on_delete=models.CASCADE
+    )
+    role = models.CharField(max_length=20, choices=ROLE_CHOICES)
+
+    class Meta:
+        unique_together = ("user", "calendar")
+
+
+class CalendarChange(models.Model):
+    # One row per object touched by a write, tagged with the calendar version
+    # the write produced, so clients can fetch only what moved since theirs
+    KIND_CHOICES = [
+        ("calendar", "Calendar"),
+        ("day", "Day"),
+        ("timeslot", "Timeslot"),
+        ("participant", "Participant"),
+        ("invitation", "Invitation"),
+    ]
+    calendar = models.ForeignKey(
+        Calendar, related_name="changes", on_delete=models.CASCADE
+    )
+    version = models.PositiveIntegerField()
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    deleted = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["calendar", "version"], name="calendar_change_idx"),
+        ]
@@ -0,0 +1,152 @@
+import re
+from datetime import date, time
+from django.contrib.auth.models import User
+from Calendars.changes import change_log
+from Calendars.models import Calendar, CalendarChange, Day, Membership, Participant
+from Calendars.views import visible_calendars
+from Contacts.models import Contact
+from Contacts.search import matching_users
+from Invitations.models import Invitation
+from Invitations.views import friend_statuses, inbox
+from OneOnOne.pagination import (
+    MembershipCursorPagination,
+    NewestFirstCursorPagination,
+    StartTimeCursorPagination,
+    UsernameCursorPagination,
+)
+from TimeSlots.models import AvailabilityMask, DayCoverage, TimeSlot
+from TimeSlots.views import day_timeslots
+
+# The id, parent and notused columns SQLite puts before each step of a plan
+PLAN_COLUMNS = re.compile(r"^(\d+ ){3}")
+# A table or one of its indexes read from end to end, only SEARCH steps seek
+# to the rows they need
+FULL_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)")
+TEMP_SORT = re.compile(r"USE TEMP B-TREE")
+
+
+def plan_problems(plan, allow_sort=False):
+    """
+    The steps of an EXPLAIN QUERY PLAN output that scan a table or a whole
+    index, or sort in a temp B-tree unless allow_sort is set.
+    """
+    problems = []
+    for line in plan.splitlines():
+        step = PLAN_COLUMNS.sub("", line.strip())
+        if FULL_SCAN.search(step) or (TEMP_SORT.search(step) and not allow_sort):
+            problems.append(step)
+    return problems
+
+
+def seed():
+    """
+    Rows in every table the hot queries read, returning the objects they
+    filter on. Callers roll them back once the plans are taken.
+    """
+    users = User.objects.bulk_create(
+        User(username=f"query-plan-{index}") for index in range(4)
+    )
+    user, friend, pending, stranger = users
+    calendar = Calendar.objects.create(title="Query plan", description="", creator=user)
+    Membership.objects.bulk_create(
+        [
+            Membership(user=user, calendar=calendar, role="creator"),
+            Membership(user=friend, calendar=calendar, role="participant"),
+        ]
+    )
+    Participant.objects.create(user=friend, calendar=calendar)
+    day = Day.objects.create(calendar=calendar, date=date(2030, 1, 1), ranking=1)
+    TimeSlot.objects.create(
+        day=day, owner=friend, start_time=time(9), end_time=time(10)
+    )
+    AvailabilityMask.objects.create(owner=friend, day=day, bits=bytes(12))
+    DayCoverage.objects.create(day=day)
+    CalendarChange.objects.create(
+        calendar=calendar, version=2, kind="day", object_id=day.id
+    )
+    Invitation.objects.create(calendar=calendar, invitee=pending, inviter=user)
+    Contact.objects.bulk_create(
+        [
+            Contact(userA=user, userB=friend, status=1),
+            Contact(userA=pending, userB=user, status=2),
+            Contact(userA=user, userB=stranger, status=2),
+        ]
+    )
+    return user, friend, calendar, day
+
+
+def first_page(queryset, pagination):
+    """queryset ordered and cut the way pagination reads its first page."""
+    size = pagination.page_size or pagination.max_page_size
+    # Cursor pagination reads one row more to tell whether a next page exists
+    return queryset.order_by(*pagination.ordering)[: size + 1]
+
+
+def hot_queries(user, friend, calendar, day):
+    """
+    The queries behind the busiest endpoints, built by the helpers the views
+    build them with, as (name, queryset, allow_sort) tuples. allow_sort is
+    only set where the rows sorted are already narrowed down by an index.
+    """
+    queries = [
+        (
+            "calendar membership",
+            Membership.objects.filter(calendar=calendar, user=user),
+        ),
+        (
+            "calendar list",
+            first_page(visible_calendars(user), MembershipCursorPagination),
+        ),
+        ("calendar changes", change_log(calendar, 1)),
+        (
+            "timeslots of a day",
+            first_page(day_timeslots(calendar.id, day.id), StartTimeCursorPagination),
+        ),
+        (
+            "timeslots of a day by owner",
+            first_page(
+                day_timeslots(calendar.id, day.id, friend.username),
+                StartTimeCursorPagination,
+            ),
+        ),
+        (
+            "timeslots of an owner in a calendar",
+            TimeSlot.objects.filter(day__calendar=calendar, owner=friend),
+        ),
+        (
+            "availability masks of a day",
+            AvailabilityMask.objects.filter(day=day),
+        ),
+        ("day coverage", DayCoverage.objects.filter(day_id__in=[day.id])),
+        (
+            "invitation inbox",
+            first_page(inbox(user, ["pending"]), NewestFirstCursorPagination),
+        ),
+        (
+            "invitation inbox, every status",
+            first_page(inbox(user), NewestFirstCursorPagination),
+        ),
+        ("friends", Contact.objects.friendships(user)),
+        ("incoming requests", Contact.objects.incoming(user)),
+        ("outgoing requests", Contact.objects.outgoing(user)),
+        (
+            "contact pair",
+            Contact.objects.filter(**Contact.pair(friend, user)),
+        ),
+    ]
+    return [(name, queryset, False) for name, queryset in queries] + [
+        # The friends come from the primary key, each with its latest
+        # invitation from the calendar index, then only they are sorted
+        (
+            "friend invitation statuses",
+            first_page(friend_statuses(user, calendar), UsernameCursorPagination),
+            True,
+        ),
+        # Each field's range comes from its LOWER() index, then only the
+        # matches are sorted by username
+        (
+            "user search",
+            matching_users("query").order_by("username")[:50],
+            True,
+        ),
+    ]
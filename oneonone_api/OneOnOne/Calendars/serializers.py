@@ -1,7 +1,67 @@
 from rest_framework import serializers
-from .models import Calendar, Day, Participant
+from .models import Calendar, Day, Participant, Membership
+from TimeSlots.models import TimeSlot
 from TimeSlots.serializers import TimeSlotSerializer
-from django.db.models import Max
+from Invitations.serializers import InvitationSerializer
+from Auth.summary import invalidate_summaries
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+
+
+def validate_unique_rankings(days_data):
+    rankings = [day_data["ranking"] for day_data in days_data]
+    if len(rankings) != len(set(rankings)):
+        raise serializers.ValidationError("Each day must have a unique ranking.")
+    return days_data
+
+
+def create_calendars(calendars_data):
+    """
+    Create calendars from validated data, each including its creator, along
+    with their days and creator memberships. Uses one bulk INSERT per table
+    inside a single transaction however many calendars are given.
+    """
+    calendars_data = [dict(calendar_data) for calendar_data in calendars_data]
+    days_data = [calendar_data.pop("days") for calendar_data in calendars_data]
+    for calendar_data in calendars_data:
+        calendar_data.pop("participants", None)
+
+    with transaction.atomic():
+        calendars = Calendar.objects.bulk_create(
+            Calendar(**calendar_data) for calendar_data in calendars_data
+        )
+        Membership.objects.bulk_create(
+            Membership(user_id=calendar.creator_id, calendar=calendar, role="creator")
+            for calendar in calendars
+        )
+        Day.objects.bulk_create(
+            Day(calendar=calendar, date=day_data["date"], ranking=day_data["ranking"])
+            for calendar, calendar_days in zip(calendars, days_data)
+            for day_data in calendar_days
+        )
+    return calendars
+
+
+def create_calendar_batch(creator, items):
+    """
+    Validate every calendar payload in items on its own, create the valid ones
+    with create_calendars and return one result per item, holding either the
+    new calendar id or the validation errors.
+    """
+    results = []
+    valid = []
+    for index, item in enumerate(items):
+        serializer = CalendarCreateSerializer(data=item)
+        if serializer.is_valid():
+            valid.append((index, {**serializer.validated_data, "creator": creator}))
+            results.append({"index": index, "id": None})
+        else:
+            results.append({"index": index, "errors": serializer.errors})
+
+    calendars = create_calendars([calendar_data for _, calendar_data in valid])
+    for (index, _), calendar in zip(valid, calendars):
+        results[index]["id"] = calendar.id
+    return results
 
 
 class FinalizeCalendarSerializer(serializers.ModelSerializer):
@@ -19,9 +79,25 @@ class FinalizeCalendarSerializer(serializers.ModelSerializer):
         instance.final_timeslot_end = validated_data.get("final_timeslot_end")
         instance.is_finalized = True
         instance.save()
+        Calendar.bump_version(instance.pk, changed={"calendar": [instance.pk]})
+        # A finalized calendar no longer awaits anyone's availability
+        invalidate_summaries(
+            instance.participants.values_list("user_id", flat=True)
+        )
         return instance
 
 
+class SuggestionSerializer(serializers.Serializer):
+    day_id = serializers.IntegerField()
+    date = serializers.DateField()
+    ranking = serializers.IntegerField()
+    start_time = serializers.TimeField(format="%H:%M")
+    end_time = serializers.TimeField(format="%H:%M")
+    duration = serializers.IntegerField(help_text="Length of the window in minutes")
+    available_count = serializers.IntegerField()
+    available_usernames = serializers.ListField(child=serializers.CharField())
+
+
 class ParticipantSerializer(serializers.ModelSerializer):
     username = serializers.SerializerMethodField()
     email = serializers.EmailField(source="user.email")
@@ -50,6 +126,14 @@ class CalendarSerializer(serializers.ModelSerializer):
     final_timeslot_start = serializers.SerializerMethodField()
     final_timeslot_end = serializers.SerializerMethodField()
 
+    def __init__(self, *args, **kwargs):
+        # Optional sparse fieldset, only these fields are serialized
+        fields = kwargs.pop("fields", None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
     def get_creator_username(self, obj) -> str:
         return obj.creator.username
 
@@ -66,12 +150,7 @@ class CalendarSerializer(serializers.ModelSerializer):
         )
 
     def create(self, validated_data):
-        days_data = validated_data.pop("days")
-        validated_data.pop("participants", None)
-        calendar = Calendar.objects.create(**validated_data)
-        for day_data in days_data:
-            Day.objects.create(calendar=calendar, **day_data)
-        return calendar
+        return create_calendars([validated_data])[0]
 
     def validate_days(self, value):
         if not value:
@@ -87,11 +166,26 @@ class CalendarSerializer(serializers.ModelSerializer):
 
     def update(self, instance, validated_data):
         days_data = validated_data.pop("days", None)
+        changed = {"calendar": [instance.pk]}
+        deleted = {}
         if days_data is not None:
+            deleted["day"] = list(instance.days.values_list("id", flat=True))
+            deleted["timeslot"] = list(
+                TimeSlot.objects.filter(day__calendar=instance).values_list(
+                    "id", flat=True
+                )
+            )
             instance.days.all().delete()  # Remove existing days
+            invalidate_summaries(
+                instance.participants.values_list("user_id", flat=True)
+            )
+            changed["day"] = []
             for day_data in days_data:
-                Day.objects.create(calendar=instance, **day_data)
-        return super().update(instance, validated_data)
+                day = Day.objects.create(calendar=instance, **day_data)
+                changed["day"].append(day.id)
+        instance = super().update(instance, validated_data)
+        Calendar.bump_version(instance.pk, changed=changed, deleted=deleted)
+        return instance
 
     class Meta:
         model = Calendar
@@ -106,7 +200,9 @@ class CalendarSerializer(serializers.ModelSerializer):
             "description",
             "days",
             "participants",
+            "version",
         ]
+        read_only_fields = ["version"]
 
 
 class CalendarCreateSerializer(serializers.ModelSerializer):
@@ -121,12 +217,11 @@ class CalendarCreateSerializer(serializers.ModelSerializer):
             "days",
         ]
 
+    def validate_days(self, value):
+        return validate_unique_rankings(value)
+
     def create(self, validated_data):
-        days_data = validated_data.pop("days")
-        calendar = Calendar.objects.create(**validated_data)
-        for day_data in days_data:
-            Day.objects.create(calendar=calendar, **day_data)
-        return calendar
+        return create_calendars([validated_data])[0]
 
 
 class CalendarEditSerializer(serializers.ModelSerializer):
@@ -141,52 +236,126 @@ class CalendarEditSerializer(serializers.ModelSerializer):
             "days",
         ]
 
+    def validate_days(self, value):
+        return validate_unique_rankings(value)
+
     def update(self, instance, validated_data):
         days_data = validated_data.pop("days", None)
-        instance.title = validated_data.get("title", instance.title)
-        instance.description = validated_data.get("description", instance.description)
-        instance.save()
-        if days_data is not None:
-            # Collect IDs of days that are meant to be updated
-            update_day_ids = [
-                day_data.get("id") for day_data in days_data if day_data.get("id")
-            ]
-
-            # Delete days that are not in the update payload
-            instance.days.exclude(id__in=update_day_ids).delete()
-
-            # Temporarily set rankings to a safe value
-            max_ranking = (
-                Day.objects.filter(calendar=instance).aggregate(Max("ranking"))[
-                    "ranking__max"
-                ]
-                or 0
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            changed = {"calendar": [instance.pk]}
+            deleted = {}
+            if days_data is not None:
+                changed["day"], deleted["day"], deleted["timeslot"] = self.update_days(
+                    instance, days_data
+                )
+                # Dropped days take their timeslots with them
+                invalidate_summaries(
+                    instance.participants.values_list("user_id", flat=True)
+                )
+            Calendar.bump_version(instance.pk, changed=changed, deleted=deleted)
+        return instance
+
+    def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance],
+            Prefetch(
+                "days__timeslots", queryset=TimeSlot.objects.select_related("owner")
+            ),
+        )
+        return super().to_representation(instance)
+
+    def update_days(self, instance, days_data):
+        """
+        Diff the days payload against the stored days and apply it with a
+        fixed number of bulk statements, whatever the number of days. Returns
+        the ids of the changed days, of the deleted days and of the timeslots
+        deleted along with them.
+        """
+        existing = {day.id: day for day in instance.days.all()}
+        kept = [day_data for day_data in days_data if day_data.get("id") in existing]
+
+        # Delete days that are not in the update payload
+        deleted_ids = list(existing.keys() - {day_data["id"] for day_data in kept})
+        deleted_timeslot_ids = list(
+            TimeSlot.objects.filter(day_id__in=deleted_ids).values_list(
+                "id", flat=True
             )
+        )
+        Day.objects.filter(id__in=deleted_ids).delete()
+
+        changed = []
+        moved = []
+        for day_data in kept:
+            day = existing[day_data["id"]]
+            if day.date == day_data["date"] and day.ranking == day_data["ranking"]:
+                continue
+            if day.ranking != day_data["ranking"]:
+                moved.append(day)
+            changed.append((day, day_data))
+
+        # Park moved days on unused negative rankings first so that swapping
+        # rankings never breaks the (calendar, ranking) constraint midway
+        for day in moved:
+            day.ranking = -day.id
+        Day.objects.bulk_update(moved, ["ranking"])
+
+        for day, day_data in changed:
+            day.date = day_data["date"]
+            day.ranking = day_data["ranking"]
+        Day.objects.bulk_update([day for day, _ in changed], ["date", "ranking"])
+
+        # Create new days since they dont have an ID
+        created = Day.objects.bulk_create(
+            Day(calendar=instance, date=day_data["date"], ranking=day_data["ranking"])
+            for day_data in days_data
+            if not day_data.get("id")
+        )
+        changed_ids = [day.id for day, _ in changed] + [day.id for day in created]
+        return changed_ids, deleted_ids, deleted_timeslot_ids
+
+
+class CalendarBatchResultSerializer(serializers.Serializer):
+    index = serializers.IntegerField()
+    id = serializers.IntegerField(required=False)
+    errors = serializers.DictField(required=False)
 
-            temp_ranking_start = max_ranking + 1
-            for i, day_data in enumerate(days_data):
-                day_id = day_data.get("id", None)
-                temp_ranking = temp_ranking_start + i
-                if day_id:
-                    # Temporarily update existing day with a safe ranking, ensuring 'ranking' is not duplicated
-                    Day.objects.filter(id=day_id, calendar=instance).update(
-                        ranking=temp_ranking, date=day_data["date"]
-                    )
-                else:
-                    # Create new day since it doesnt have an ID
-                    Day.objects.create(
-                        calendar=instance,
-                        ranking=day_data["ranking"],
-                        date=day_data["date"],
-                    )
-
-            # Now, update to the intended rankings
-            for i, day_data in enumerate(days_data):
-                day_id = day_data.get("id", None)
-                if day_id:
-                    # Ensure 'ranking' is not duplicated when updating
-                    Day.objects.filter(id=day_id, calendar=instance).update(
-                        ranking=day_data["ranking"]
-                    )
-
-        return super().update(instance, validated_data)
+
+class DayChangeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Day
+        fields = ["id", "date", "ranking"]
+
+
+class TimeSlotChangeSerializer(TimeSlotSerializer):
+    day_id = serializers.IntegerField(read_only=True)
+
+    class Meta(TimeSlotSerializer.Meta):
+        fields = TimeSlotSerializer.Meta.fields + ["day_id"]
+
+
+class DeletedObjectsSerializer(serializers.Serializer):
+    days = serializers.ListField(child=serializers.IntegerField())
+    timeslots = serializers.ListField(child=serializers.IntegerField())
+    participants = serializers.ListField(child=serializers.IntegerField())
+    invitations = serializers.ListField(child=serializers.IntegerField())
+
+
+class CalendarChangesSerializer(serializers.Serializer):
+    version = serializers.IntegerField(help_text="Token to pass as since next time")
+    reset = serializers.BooleanField(
+        help_text="The change log does not reach back to since, refetch the calendar"
+    )
+    calendar = CalendarSerializer(
+        allow_null=True,
+        fields=[
+            field
+            for field in CalendarSerializer.Meta.fields
+            if field not in ("days", "participants")
+        ],
+    )
+    days = DayChangeSerializer(many=True)
+    timeslots = TimeSlotChangeSerializer(many=True)
+    participants = ParticipantSerializer(many=True)
+    invitations = InvitationSerializer(many=True)
+    deleted = DeletedObjectsSerializer()
@@ -0,0 +1,538 @@
+import json
+import tempfile
+from io import StringIO
+import threading
+from datetime import date, time
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from TimeSlots.models import TimeSlot
+from .availability import day_windows
+from .changes import changes_since
+from .events import publish
+from .models import Calendar, CalendarChange, Day, Membership, Participant
+from .query_plans import hot_queries, plan_problems, seed
+from .views import SUMMARY_FIELDS
+
+# Queries behind GET /calendars/, GET /calendars/<pk>/ and the summary list,
+# whatever the number of calendars, days, participants and timeslots
+LIST_QUERIES = 5
+DETAIL_QUERIES = 5
+SUMMARY_QUERIES = 2
+
+
+class DayWindowsTests(SimpleTestCase):
+    def test_nested_groups(self):
+        slots = [("ann", 540, 720), ("bob", 600, 660), ("cat", 570, 690)]
+        self.assertCountEqual(
+            day_windows(slots, 0),
+            [
+                (540, 720, frozenset({"ann"})),
+                (570, 690, frozenset({"ann", "cat"})),
+                (600, 660, frozenset({"ann", "bob", "cat"})),
+            ],
+        )
+
+    def test_group_returning_after_a_wider_one(self):
+        # ann and bob are free, then cat joins, then cat leaves again
+        slots = [("ann", 0, 180), ("bob", 0, 180), ("cat", 60, 120)]
+        self.assertCountEqual(
+            day_windows(slots, 0),
+            [
+                (0, 180, frozenset({"ann", "bob"})),
+                (60, 120, frozenset({"ann", "bob", "cat"})),
+            ],
+        )
+
+    def test_gap_ends_windows(self):
+        slots = [("ann", 0, 60), ("ann", 120, 180)]
+        self.assertCountEqual(
+            day_windows(slots, 0),
+            [(0, 60, frozenset({"ann"})), (120, 180, frozenset({"ann"}))],
+        )
+
+    def test_min_duration(self):
+        slots = [("ann", 0, 120), ("bob", 30, 45)]
+        self.assertEqual(day_windows(slots, 30), [(0, 120, frozenset({"ann"}))])
+
+    def test_touching_slots_of_one_owner_merge(self):
+        slots = [("ann", 0, 60), ("ann", 60, 90), ("ann", 30, 45)]
+        self.assertEqual(day_windows(slots, 0), [(0, 90, frozenset({"ann"}))])
+
+
+class CalendarQueryCountTests(APITestCase):
+    """Listing and reading calendars costs the same whatever their size."""
+
+    def setUp(self):
+        self.user = User.objects.create(username="creator")
+        self.client.force_authenticate(self.user)
+
+    def make_calendars(self, count):
+        """count calendars with count days, participants and timeslots each."""
+        participants = User.objects.bulk_create(
+            User(username=f"participant-{count}-{index}")
+            for index in range(count)
+        )
+        calendars = Calendar.objects.bulk_create(
+            Calendar(title=f"Calendar {index}", description="", creator=self.user)
+            for index in range(count)
+        )
+        Membership.objects.bulk_create(
+            Membership(user=self.user, calendar=calendar, role="creator")
+            for calendar in calendars
+        )
+        Participant.objects.bulk_create(
+            Participant(user=user, calendar=calendar)
+            for calendar in calendars
+            for user in participants
+        )
+        days = Day.objects.bulk_create(
+            Day(calendar=calendar, date=date(2030, 1, index + 1), ranking=index + 1)
+            for calendar in calendars
+            for index in range(count)
+        )
+        TimeSlot.objects.bulk_create(
+            TimeSlot(day=day, owner=user, start_time=time(9), end_time=time(10))
+            for day in days
+            for user in participants
+        )
+        return calendars
+
+    def test_list(self):
+        for count in (1, 5, 20):
+            with self.subTest(count=count):
+                Calendar.objects.all().delete()
+                self.make_calendars(count)
+                with self.assertNumQueries(LIST_QUERIES):
+                    response = self.client.get("/calendars/", {"page_size": 20})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()["results"]), count)
+
+    def test_detail(self):
+        for count in (1, 5, 20):
+            with self.subTest(count=count):
+                Calendar.objects.all().delete()
+                calendar = self.make_calendars(count)[0]
+                with self.assertNumQueries(DETAIL_QUERIES):
+                    response = self.client.get(f"/calendars/{calendar.id}/")
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()["days"]), count)
+
+    def test_summary_view(self):
+        self.make_calendars(5)
+        with self.assertNumQueries(SUMMARY_QUERIES):
+            response = self.client.get(
+                "/calendars/", {"view": "summary", "page_size": 20}
+            )
+        calendars = response.json()["results"]
+        self.assertEqual(len(calendars), 5)
+        self.assertEqual(set(calendars[0]), set(SUMMARY_FIELDS))
+
+    def test_sparse_fieldset(self):
+        self.make_calendars(5)
+        response = self.client.get("/calendars/", {"fields": "id,title"})
+        self.assertEqual(
+            [set(calendar) for calendar in response.json()["results"]],
+            [{"id", "title"}] * 5,
+        )
+
+
+class CalendarPaginationTests(APITestCase):
+    def test_edit_while_paging_keeps_the_calendar_in_place(self):
+        user = User.objects.create(username="creator")
+        self.client.force_authenticate(user)
+        calendars = [
+            Calendar.objects.create(
+                title=f"Calendar {index}", description="", creator=user
+            )
+            for index in range(3)
+        ]
+        Membership.objects.bulk_create(
+            Membership(user=user, calendar=calendar, role="creator")
+            for calendar in calendars
+        )
+        first = self.client.get("/calendars/", {"page_size": 2}).json()
+        # An edit bumps updated_at of a calendar not seen yet
+        Calendar.bump_version(calendars[0].id)
+        second = self.client.get(first["next"]).json()
+        seen = [calendar["id"] for calendar in first["results"] + second["results"]]
+        self.assertEqual(seen, [calendar.id for calendar in reversed(calendars)])
+
+
+class CalendarEditTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="creator")
+        self.client.force_authenticate(self.user)
+
+    def make_calendar(self, day_count):
+        calendar = Calendar.objects.create(
+            title="Edit", description="", creator=self.user
+        )
+        Membership.objects.create(user=self.user, calendar=calendar, role="creator")
+        days = Day.objects.bulk_create(
+            Day(calendar=calendar, date=date(2030, 1, index + 1), ranking=index + 1)
+            for index in range(day_count)
+        )
+        return calendar, days
+
+    def edit(self, calendar, days_data):
+        return self.client.put(
+            f"/calendars/{calendar.id}/",
+            {"title": "Edited", "description": "Edited", "days": days_data},
+            format="json",
+        )
+
+    def test_diff_is_applied(self):
+        calendar, (first, second, third) = self.make_calendar(3)
+        TimeSlot.objects.create(
+            day=first, owner=self.user, start_time=time(9), end_time=time(10)
+        )
+        response = self.edit(
+            calendar,
+            [
+                # Swapped rankings must not trip the (calendar, ranking) constraint
+                {"id": first.id, "date": "2030-01-01", "ranking": 2},
+                {"id": second.id, "date": "2030-02-02", "ranking": 1},
+                {"date": "2030-03-03", "ranking": 3},
+            ],
+        )
+        self.assertEqual(response.status_code, 200)
+        days = {
+            day.id: (day.date, day.ranking)
+            for day in Day.objects.filter(calendar=calendar)
+        }
+        self.assertEqual(days.pop(first.id), (date(2030, 1, 1), 2))
+        self.assertEqual(days.pop(second.id), (date(2030, 2, 2), 1))
+        self.assertEqual(list(days.values()), [(date(2030, 3, 3), 3)])
+        self.assertFalse(Day.objects.filter(id=third.id).exists())
+        # Kept days keep their timeslots
+        self.assertTrue(TimeSlot.objects.filter(day=first).exists())
+
+    def test_duplicate_rankings(self):
+        calendar, _ = self.make_calendar(1)
+        response = self.edit(
+            calendar,
+            [
+                {"date": "2030-01-01", "ranking": 1},
+                {"date": "2030-01-02", "ranking": 1},
+            ],
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_count(self):
+        counts = []
+        # At least two days so that every kind of statement runs
+        for count in (2, 6, 20):
+            calendar, days = self.make_calendar(count)
+            days_data = [
+                # Every kept day moves, half of them are replaced by new days
+                {"id": day.id, "date": str(day.date), "ranking": count - index}
+                for index, day in enumerate(days)
+                if index % 2 == 0
+            ] + [
+                {"date": "2031-01-01", "ranking": count + index + 1}
+                for index in range(count // 2)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.edit(calendar, days_data).status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(len(set(counts)), 1, counts)
+
+
+@mock.patch("Calendars.models.CHANGE_LOG_RETENTION", 3)
+class CalendarChangesTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="creator")
+        self.client.force_authenticate(self.user)
+        self.calendar = Calendar.objects.create(
+            title="Changes", description="", creator=self.user
+        )
+        Membership.objects.create(
+            user=self.user, calendar=self.calendar, role="creator"
+        )
+        self.day = Day.objects.create(
+            calendar=self.calendar, date=date(2030, 1, 1), ranking=1
+        )
+
+    def bump(self, times):
+        for _ in range(times):
+            Calendar.bump_version(self.calendar.id, changed={"day": [self.day.id]})
+        self.calendar.refresh_from_db()
+
+    def get_changes(self, since):
+        response = self.client.get(
+            f"/calendars/{self.calendar.id}/changes/", {"since": since}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_log_is_pruned_to_the_retention(self):
+        self.bump(5)
+        # Version 6, not yet twice the retention past changes_start
+        self.assertEqual(self.calendar.changes_start, 1)
+        self.assertEqual(CalendarChange.objects.count(), 5)
+        self.bump(1)
+        self.assertEqual(self.calendar.version, 7)
+        self.assertEqual(self.calendar.changes_start, 4)
+        self.assertEqual(
+            sorted(CalendarChange.objects.values_list("version", flat=True)),
+            [5, 6, 7],
+        )
+
+    def test_clients_behind_the_log_reset(self):
+        self.bump(6)
+        self.assertTrue(self.get_changes(3)["reset"])
+        changes = self.get_changes(4)
+        self.assertFalse(changes["reset"])
+        self.assertEqual(changes["version"], 7)
+        self.assertEqual([day["id"] for day in changes["days"]], [self.day.id])
+
+    def test_version_covers_rows_newer_than_the_calendar(self):
+        stale = Calendar.objects.get(id=self.calendar.id)
+        Calendar.bump_version(self.calendar.id, changed={"calendar": [stale.id]})
+        Calendar.objects.filter(id=stale.id).update(title="Renamed")
+        changes = changes_since(stale, 1)
+        self.assertEqual(changes["version"], 2)
+        self.assertEqual(changes["calendar"].title, "Renamed")
+
+    def test_pruned_while_reading_resets(self):
+        stale = Calendar.objects.get(id=self.calendar.id)
+        self.bump(6)
+        self.assertTrue(changes_since(stale, 1)["reset"])
+
+
+@mock.patch("Calendars.views.EVENTS_POLL_SECONDS", 0.5)
+class CalendarEventsPollTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="creator")
+        self.calendar = Calendar.objects.create(
+            title="Events", description="", creator=self.user
+        )
+        Membership.objects.create(
+            user=self.user, calendar=self.calendar, role="creator"
+        )
+        self.url = f"/calendars/{self.calendar.id}/events/poll/"
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}"
+        )
+
+    def poll(self, since):
+        return self.client.get(self.url, {"since": since})
+
+    def test_answers_at_once_when_behind(self):
+        Calendar.bump_version(self.calendar.id)
+        response = self.poll(1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"version": 2})
+
+    def test_times_out_unchanged(self):
+        self.assertEqual(self.poll(1).json(), {"version": 1})
+
+    def test_wakes_on_a_change(self):
+        timer = threading.Timer(0.1, publish, (self.calendar.id, {"version": 2}))
+        timer.start()
+        try:
+            self.assertEqual(self.poll(1).json(), {"version": 2})
+        finally:
+            timer.join()
+
+    def test_requires_a_member(self):
+        self.client.credentials()
+        self.assertEqual(self.poll(1).status_code, 401)
+        stranger = User.objects.create(username="stranger")
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(stranger)}"
+        )
+        self.assertEqual(self.poll(1).status_code, 403)
+
+
+class QueryPlanTests(TestCase):
+    def test_plan_problems(self):
+        plan = "\n".join(
+            [
+                "2 0 0 SCAN Calendars_calendar",
+                "3 0 0 SCAN TABLE Calendars_day",
+                "4 0 0 SCAN Contacts_contact USING INDEX contact_pair_unique",
+                "5 0 0 SCAN auth_user USING COVERING INDEX auth_user_username",
+                "6 0 0 SEARCH TimeSlots_timeslot USING INDEX day_idx (day_id=?)",
+                "7 0 0 SCAN CONSTANT ROW",
+                "8 0 0 USE TEMP B-TREE FOR ORDER BY",
+            ]
+        )
+        # Reading a whole index is no better than reading the table
+        self.assertEqual(
+            plan_problems(plan),
+            [
+                "SCAN Calendars_calendar",
+                "SCAN TABLE Calendars_day",
+                "SCAN Contacts_contact USING INDEX contact_pair_unique",
+                "SCAN auth_user USING COVERING INDEX auth_user_username",
+                "USE TEMP B-TREE FOR ORDER BY",
+            ],
+        )
+        self.assertEqual(len(plan_problems(plan, allow_sort=True)), 4)
+
+    @skipUnlessDBFeature("supports_explaining_query_execution")
+    def test_hot_queries_use_an_index(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("Plans are read in SQLite's EXPLAIN QUERY PLAN format")
+        for name, queryset, allow_sort in hot_queries(*seed()):
+            with self.subTest(name):
+                plan = queryset.explain()
+                self.assertEqual(plan_problems(plan, allow_sort), [], plan)
+
+
+class CalendarETagTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="creator")
+        self.client.force_authenticate(self.user)
+        self.calendars = Calendar.objects.bulk_create(
+            Calendar(title=f"Calendar {index}", description="", creator=self.user)
+            for index in range(3)
+        )
+        Membership.objects.bulk_create(
+            Membership(user=self.user, calendar=calendar, role="creator")
+            for calendar in self.calendars
+        )
+
+    def assertNotModified(self, url, etag, **params):
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_list(self):
+        first = self.client.get("/calendars/", {"page_size": 2})
+        self.assertEqual(first.status_code, 200)
+        etag = first["ETag"]
+        self.assertNotModified("/calendars/", etag, page_size=2)
+        # An edit to a calendar of the page changes its ETag
+        Calendar.bump_version(self.calendars[2].id)
+        response = self.client.get(
+            "/calendars/", {"page_size": 2}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_list_page_ignores_other_pages(self):
+        first = self.client.get("/calendars/", {"page_size": 2}).json()
+        second = self.client.get(first["next"])
+        Calendar.bump_version(self.calendars[2].id)
+        self.assertNotModified(first["next"], second["ETag"])
+        # A new calendar shifts the first page only
+        calendar = Calendar.objects.create(
+            title="New", description="", creator=self.user
+        )
+        Membership.objects.create(user=self.user, calendar=calendar, role="creator")
+        self.assertNotModified(first["next"], second["ETag"])
+
+    def test_list_304_reads_one_page(self):
+        etag = self.client.get("/calendars/", {"page_size": 2})["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertNotModified("/calendars/", etag, page_size=2)
+        # The page and the row telling whether there is a next one
+        (query,) = queries
+        self.assertIn("LIMIT 3", query["sql"])
+
+    def test_detail_changes_with_a_timeslot_write(self):
+        calendar = self.calendars[0]
+        day = Day.objects.create(calendar=calendar, date=date(2030, 1, 1), ranking=1)
+        Participant.objects.create(user=self.user, calendar=calendar)
+        url = f"/calendars/{calendar.id}/"
+        etag = self.client.get(url)["ETag"]
+        self.assertNotModified(url, etag)
+        response = self.client.post(
+            f"/calendars/{calendar.id}/day/{day.id}/timeslot/",
+            [{"start_time": "09:00", "end_time": "10:00"}],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class CalendarBatchCreateTests(APITestCase):
+    url = "/calendars/batch/"
+
+    def setUp(self):
+        self.user = User.objects.create(username="creator")
+        self.client.force_authenticate(self.user)
+
+    def item(self, title, day_count=2):
+        return {
+            "title": title,
+            "description": "Batch",
+            "days": [
+                {"date": f"2030-01-{index + 1:02}", "ranking": index + 1}
+                for index in range(day_count)
+            ],
+        }
+
+    def test_mixed_batch(self):
+        duplicate = self.item("Duplicate rankings")
+        duplicate["days"][1]["ranking"] = 1
+        response = self.client.post(
+            self.url,
+            [self.item("First"), {"description": "No title"}, duplicate],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        first, untitled, duplicated = response.json()
+        calendar = Calendar.objects.get()
+        self.assertEqual(first, {"index": 0, "id": calendar.id})
+        self.assertEqual(untitled["index"], 1)
+        self.assertIn("title", untitled["errors"])
+        self.assertEqual(duplicated["index"], 2)
+        self.assertIn("days", duplicated["errors"])
+        self.assertEqual(calendar.days.count(), 2)
+        self.assertEqual(
+            list(calendar.memberships.values_list("user_id", "role")),
+            [(self.user.id, "creator")],
+        )
+
+    def test_nothing_valid(self):
+        response = self.client.post(self.url, [{"title": ""}], format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Calendar.objects.exists())
+
+    def test_payload_must_be_a_capped_list(self):
+        for payload in ({"title": "Not a list"}, []):
+            self.assertEqual(
+                self.client.post(self.url, payload, format="json").status_code, 400
+            )
+        items = [self.item(f"Calendar {index}", 0) for index in range(501)]
+        response = self.client.post(self.url, items, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Calendar.objects.exists())
+
+    def test_query_count(self):
+        counts = []
+        for count in (2, 20):
+            items = [self.item(f"Calendar {count}-{index}") for index in range(count)]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.url, items, format="json")
+            self.assertEqual(response.status_code, 201)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1], counts)
+        self.assertEqual(
+            Membership.objects.filter(user=self.user, role="creator").count(), 22
+        )
+
+    def test_import_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as file:
+            json.dump([self.item("Imported"), {"title": ""}], file)
+            file.flush()
+            out, err = StringIO(), StringIO()
+            call_command(
+                "import_calendars", "creator", file.name, stdout=out, stderr=err
+            )
+        self.assertIn("Created 1 of 2 calendars.", out.getvalue())
+        self.assertIn("Calendar 1: ", err.getvalue())
+        calendar = Calendar.objects.get()
+        self.assertEqual(calendar.title, "Imported")
+        self.assertTrue(calendar.memberships.filter(user=self.user).exists())
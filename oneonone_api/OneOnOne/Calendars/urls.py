@@ -3,19 +3,32 @@ from .views import (
     CalendarListCreateAPIView,
     CalendarRetrieveUpdateDestroyAPIView,
     FinalizeCalendarView,
+    CalendarSuggestionsAPIView,
+    CalendarBatchCreateAPIView,
+    CalendarChangesAPIView,
+    calendar_events_poll,
 )
 from Invitations.views import (
     InvitationListCreateAPIView,
     InvitationChangeStatusAPIView,
     InvitationListAPIView,
+    InvitationBatchRespondAPIView,
 )
 from TimeSlots.views import (
     TimeSlotListCreateAPIView,
     TimeSlotRetrieveUpdateDestroyAPIView,
+    DayCoverageListAPIView,
+    AvailabilityAPIView,
+    AvailabilityMaskAPIView,
 )
 
 urlpatterns = [
     path("", CalendarListCreateAPIView.as_view(), name="calendars_list_create"),
+    path(
+        "batch/",
+        CalendarBatchCreateAPIView.as_view(),
+        name="calendars_batch_create",
+    ),
     path(
         "<int:pk>/",
         CalendarRetrieveUpdateDestroyAPIView.as_view(),
@@ -26,6 +39,21 @@ urlpatterns = [
         FinalizeCalendarView.as_view(),
         name="finalize-calendar",
     ),
+    path(
+        "<int:pk>/suggestions/",
+        CalendarSuggestionsAPIView.as_view(),
+        name="calendar-suggestions",
+    ),
+    path(
+        "<int:pk>/changes/",
+        CalendarChangesAPIView.as_view(),
+        name="calendar-changes",
+    ),
+    path(
+        "<int:pk>/events/poll/",
+        calendar_events_poll,
+        name="calendar-events-poll",
+    ),
     path(
         "<int:calendar_id>/day/<int:day_id>/timeslot/",
         TimeSlotListCreateAPIView.as_view(),
@@ -36,11 +64,31 @@ urlpatterns = [
         TimeSlotRetrieveUpdateDestroyAPIView.as_view(),
         name="timeslot_detail",
     ),
+    path(
+        "<int:calendar_id>/day/<int:day_id>/masks/",
+        AvailabilityMaskAPIView.as_view(),
+        name="day_availability_masks",
+    ),
+    path(
+        "<int:calendar_id>/availability/",
+        AvailabilityAPIView.as_view(),
+        name="calendar_availability",
+    ),
+    path(
+        "<int:calendar_id>/heatmap/",
+        DayCoverageListAPIView.as_view(),
+        name="calendar_heatmap",
+    ),
     path(
         "invitations/",
         InvitationListAPIView.as_view(),
         name="invitations_list",
     ),
+    path(
+        "invitations/respond/",
+        InvitationBatchRespondAPIView.as_view(),
+        name="invitations_batch_respond",
+    ),
     path(
         "<int:calendar_id>/invitations/",
         InvitationListCreateAPIView.as_view(),
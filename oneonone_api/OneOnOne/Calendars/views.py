@@ -1,19 +1,100 @@
+import asyncio
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
 from rest_framework import generics
-from .models import Calendar
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from .models import Calendar, Participant, Membership
 from .serializers import (
     CalendarSerializer,
     CalendarCreateSerializer,
     CalendarEditSerializer,
     FinalizeCalendarSerializer,
+    SuggestionSerializer,
+    CalendarBatchResultSerializer,
+    CalendarChangesSerializer,
+    create_calendar_batch,
 )
+from .availability import suggest_windows
+from .changes import changes_since
+from .events import get_backend
+from .etags import ETagMixin
 from rest_framework.permissions import IsAuthenticated
 from drf_spectacular.utils import extend_schema_view, extend_schema
-from drf_spectacular.utils import OpenApiResponse
-from rest_framework.exceptions import PermissionDenied
-from django.db.models import Q
+from drf_spectacular.utils import OpenApiResponse, OpenApiParameter
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from django.db import transaction
+from django.db.models import F, Prefetch
 from rest_framework.response import Response
 from rest_framework import status
 from TimeSlots.models import TimeSlot
+from TimeSlots.coverage import lock_owner_masks, update_coverage
+from Auth.summary import invalidate_summaries
+from OneOnOne.pagination import MembershipCursorPagination
+
+
+# Seconds a long-poll waits for a change before answering anyway
+EVENTS_POLL_SECONDS = 25
+
+# Fields returned by ?view=summary, enough to render the calendar list page
+SUMMARY_FIELDS = [
+    "id",
+    "is_finalized",
+    "final_date",
+    "final_timeslot_start",
+    "final_timeslot_end",
+    "creator_username",
+    "title",
+    "version",
+]
+
+
+def with_calendar_details(queryset, fields=None):
+    """
+    Load everything CalendarSerializer nests (days, their timeslots and owners,
+    participants and their users, the creator) in a fixed number of queries.
+    With a sparse fieldset only the columns and relations it needs are loaded.
+    """
+    if fields is None:
+        fields = CalendarSerializer.Meta.fields
+        columns = None
+    else:
+        columns = [
+            field
+            for field in fields
+            if field not in ("days", "participants", "creator_username")
+        ]
+
+    if "creator_username" in fields:
+        queryset = queryset.select_related("creator")
+        if columns is not None:
+            columns.append("creator__username")
+    if "days" in fields:
+        queryset = queryset.prefetch_related(
+            Prefetch(
+                "days__timeslots", queryset=TimeSlot.objects.select_related("owner")
+            )
+        )
+    if "participants" in fields:
+        queryset = queryset.prefetch_related(
+            Prefetch(
+                "participants", queryset=Participant.objects.select_related("user")
+            )
+        )
+    if columns is not None:
+        queryset = queryset.only("id", *columns)
+    return queryset
+
+
+def visible_calendars(user):
+    """
+    The calendars user is a member of, annotated with the calendar id of the
+    membership row as listed_id for MembershipCursorPagination to order on.
+    """
+    return Calendar.objects.filter(memberships__user=user).annotate(
+        listed_id=F("memberships__calendar_id")
+    )
 
 
 class FinalizeCalendarView(generics.UpdateAPIView):
@@ -26,9 +107,108 @@ class FinalizeCalendarView(generics.UpdateAPIView):
         super().perform_update(serializer)
 
 
+@extend_schema_view(
+    get=extend_schema(
+        description="Rank the windows where the most participants are available",
+        parameters=[
+            OpenApiParameter(
+                "min_duration",
+                int,
+                description="Shortest window to suggest, in minutes (default 30)",
+            ),
+            OpenApiParameter(
+                "limit", int, description="Maximum number of suggestions (default 10)"
+            ),
+        ],
+        responses={200: OpenApiResponse(response=SuggestionSerializer(many=True))},
+    ),
+)
+class CalendarSuggestionsAPIView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = SuggestionSerializer
+    queryset = Calendar.objects.all()
+
+    def get_int_param(self, name, default):
+        value = self.request.query_params.get(name, default)
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise ValidationError({name: "Must be an integer."})
+        if value < 1:
+            raise ValidationError({name: "Must be a positive integer."})
+        return value
+
+    def get(self, request, *args, **kwargs):
+        calendar = self.get_object()
+        if not calendar.has_member(request.user):
+            raise PermissionDenied(
+                "You do not have permission to view suggestions for this calendar."
+            )
+
+        timeslots = TimeSlot.objects.filter(day__calendar=calendar).values_list(
+            "day_id", "owner__username", "start_time", "end_time"
+        )
+        suggestions = suggest_windows(
+            calendar.days.all(),
+            timeslots,
+            min_duration=self.get_int_param("min_duration", 30),
+            limit=self.get_int_param("limit", 10),
+        )
+        serializer = self.get_serializer(suggestions, many=True)
+        return Response(serializer.data)
+
+
+@extend_schema_view(
+    get=extend_schema(
+        description="Everything that changed in a calendar since a version",
+        parameters=[
+            OpenApiParameter(
+                "since",
+                int,
+                required=True,
+                description="Version the client last saw, from a previous response "
+                "or the calendar's version field",
+            ),
+        ],
+        responses={200: OpenApiResponse(response=CalendarChangesSerializer)},
+    ),
+)
+class CalendarChangesAPIView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = CalendarChangesSerializer
+    queryset = Calendar.objects.select_related("creator")
+
+    def get(self, request, *args, **kwargs):
+        calendar = self.get_object()
+        if not calendar.has_member(request.user):
+            raise PermissionDenied(
+                "You do not have permission to view the changes of this calendar."
+            )
+        try:
+            since = int(request.query_params["since"])
+        except (KeyError, ValueError):
+            raise ValidationError({"since": "Must be an integer."})
+
+        serializer = self.get_serializer(changes_since(calendar, since))
+        return Response(serializer.data)
+
+
 @extend_schema_view(
     list=extend_schema(
         description="List all calendars",
+        parameters=[
+            OpenApiParameter(
+                "fields",
+                str,
+                description="Comma separated list of fields to return",
+            ),
+            OpenApiParameter(
+                "view",
+                str,
+                enum=["summary"],
+                description="summary returns only the fields the calendar list shows",
+            ),
+        ],
         responses={200: OpenApiResponse(response=CalendarSerializer(many=True))},
     ),
     create=extend_schema(
@@ -37,27 +217,95 @@ class FinalizeCalendarView(generics.UpdateAPIView):
         responses={201: OpenApiResponse(response=CalendarSerializer)},
     ),
 )
-class CalendarListCreateAPIView(generics.ListCreateAPIView):
+class CalendarListCreateAPIView(ETagMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = CalendarSerializer
     queryset = Calendar.objects.all()
+    pagination_class = MembershipCursorPagination
 
     def get_serializer_class(self):
         if self.request.method == "POST":
             return CalendarCreateSerializer
         return CalendarSerializer
 
+    def get_fields(self):
+        """
+        Sparse fieldset requested through ?view=summary or ?fields=, or None
+        for the full calendar.
+        """
+        if self.request.query_params.get("view") == "summary":
+            return SUMMARY_FIELDS
+        fields = self.request.query_params.get("fields")
+        if not fields:
+            return None
+        fields = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = set(fields) - set(CalendarSerializer.Meta.fields)
+        if unknown:
+            raise ValidationError(
+                {"fields": "Unknown fields: " + ", ".join(sorted(unknown))}
+            )
+        return fields
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method == "GET":
+            kwargs["fields"] = self.get_fields()
+        return super().get_serializer(*args, **kwargs)
+
     def get_queryset(self):
-        user = self.request.user
+        queryset = visible_calendars(self.request.user)
+        if self.request.method == "GET":
+            queryset = with_calendar_details(queryset, self.get_fields())
+        return queryset
 
-        return Calendar.objects.filter(
-            Q(creator=user) | Q(participants__user=user)
-        ).distinct()
+    def get_etag_state(self):
+        # Only the requested page, found through the paginator like the page
+        # itself, so the cost does not grow with the number of calendars
+        calendars = self.paginator.paginate_queryset(
+            visible_calendars(self.request.user).only("id", "version"),
+            self.request,
+            self,
+        )
+        return (
+            [(calendar.id, calendar.version) for calendar in calendars],
+            self.paginator.has_next,
+            self.paginator.has_previous,
+        )
 
     def perform_create(self, serializer):
         serializer.save(creator=self.request.user)
 
 
+@extend_schema_view(
+    post=extend_schema(
+        description="Create many calendars at once, reporting errors per calendar",
+        request=CalendarCreateSerializer(many=True),
+        responses={
+            201: OpenApiResponse(response=CalendarBatchResultSerializer(many=True)),
+            400: OpenApiResponse(response=CalendarBatchResultSerializer(many=True)),
+        },
+    ),
+)
+class CalendarBatchCreateAPIView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = CalendarBatchResultSerializer
+    max_batch_size = 500
+
+    def post(self, request, *args, **kwargs):
+        if not isinstance(request.data, list) or not request.data:
+            raise ValidationError("Expected a non-empty list of calendars.")
+        if len(request.data) > self.max_batch_size:
+            raise ValidationError(
+                f"At most {self.max_batch_size} calendars can be created at once."
+            )
+
+        results = create_calendar_batch(request.user, request.data)
+        created = any("id" in result for result in results)
+        return Response(
+            self.get_serializer(results, many=True).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST,
+        )
+
+
 @extend_schema_view(
     retrieve=extend_schema(
         description="Retrieve a calendar",
@@ -77,7 +325,9 @@ class CalendarListCreateAPIView(generics.ListCreateAPIView):
     methods=["patch"],
     exclude=True,
 )
-class CalendarRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class CalendarRetrieveUpdateDestroyAPIView(
+    ETagMixin, generics.RetrieveUpdateDestroyAPIView
+):
     permission_classes = [IsAuthenticated]
     serializer_class = CalendarSerializer
     queryset = Calendar.objects.all()
@@ -87,6 +337,18 @@ class CalendarRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView
             return CalendarEditSerializer
         return CalendarSerializer
 
+    def get_queryset(self):
+        if self.request.method == "GET":
+            return with_calendar_details(Calendar.objects.all())
+        return Calendar.objects.all()
+
+    def get_etag_state(self):
+        return (
+            Calendar.objects.filter(pk=self.kwargs["pk"])
+            .values_list("version", flat=True)
+            .first()
+        )
+
     def update(self, request, *args, **kwargs):
         calendar = self.get_object()
         if calendar.creator != request.user:
@@ -100,14 +362,99 @@ class CalendarRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView
         is_participant = calendar.participants.filter(user=user).exists()
 
         if is_creator:
-            return super().destroy(request, *args, **kwargs)
+            affected = [
+                *calendar.participants.values_list("user_id", flat=True),
+                *calendar.invitations.filter(status="pending").values_list(
+                    "invitee_id", flat=True
+                ),
+            ]
+            response = super().destroy(request, *args, **kwargs)
+            invalidate_summaries(affected)
+            return response
         elif is_participant:
-            # Remove user from participants
-            calendar.participants.filter(user=user).delete()
-            # Delete all timeslots owned by this user in this calendar
-            TimeSlot.objects.filter(day__calendar=calendar, owner=user).delete()
+            with transaction.atomic():
+                before = lock_owner_masks(
+                    user, calendar.days.values_list("id", flat=True)
+                )
+                participant_ids = list(
+                    calendar.participants.filter(user=user).values_list(
+                        "id", flat=True
+                    )
+                )
+                timeslots = TimeSlot.objects.filter(
+                    day__calendar=calendar, owner=user
+                )
+                timeslot_ids = list(timeslots.values_list("id", flat=True))
+                # Remove user from participants
+                calendar.participants.filter(user=user).delete()
+                Membership.objects.filter(user=user, calendar=calendar).delete()
+                # Delete all timeslots owned by this user in this calendar
+                timeslots.delete()
+                update_coverage(user, before)
+                invalidate_summaries([user.id])
+                Calendar.bump_version(
+                    calendar.pk,
+                    deleted={"participant": participant_ids, "timeslot": timeslot_ids},
+                )
             return Response(status=status.HTTP_204_NO_CONTENT)
         else:
             raise PermissionDenied(
                 "You do not have permission to delete this calendar."
             )
+
+
+async def get_listened_calendar(request, pk):
+    """
+    Authenticate request with its JWT like the DRF views do and return
+    (calendar, None) for a member, or (None, response) to answer with.
+    """
+    try:
+        result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except AuthenticationFailed as error:
+        return None, JsonResponse({"detail": str(error.detail)}, status=401)
+    if result is None:
+        return None, JsonResponse(
+            {"detail": "Authentication credentials were not provided."}, status=401
+        )
+    calendar = await Calendar.objects.filter(pk=pk).afirst()
+    if calendar is None:
+        return None, JsonResponse({"detail": "Not found."}, status=404)
+    if not await calendar.memberships.filter(user=result[0]).aexists():
+        return None, JsonResponse(
+            {"detail": "You do not have permission to listen to this calendar."},
+            status=403,
+        )
+    return calendar, None
+
+
+@require_GET
+async def calendar_events_poll(request, pk):
+    """
+    Long-poll for the calendar's version, authenticated with the same JWT
+    header as the rest of the API. Answers as soon as the version moves past
+    ?since=, or unchanged after EVENTS_POLL_SECONDS, and the client then
+    fetches what moved from the changes endpoint. Served over ASGI (see
+    run.sh) the wait is a suspended coroutine, under WSGI it holds a worker
+    thread.
+    """
+    try:
+        since = int(request.GET["since"])
+    except (KeyError, ValueError):
+        return JsonResponse({"since": ["Must be an integer."]}, status=400)
+
+    backend = get_backend()
+    queue = backend.subscribe(pk)
+    try:
+        calendar, response = await get_listened_calendar(request, pk)
+        if response is not None:
+            return response
+        version = calendar.version
+        if version <= since:
+            try:
+                event = await asyncio.wait_for(queue.get(), EVENTS_POLL_SECONDS)
+                version = event["version"]
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        backend.unsubscribe(pk, queue)
+    return JsonResponse({"version": version})
@@ -0,0 +1,45 @@
+from django.core.cache import cache
+from django.db import transaction
+from OneOnOne.caches import require_shared_cache
+from .models import Contact
+
+# A set is dropped when the contact views change it, in whichever process
+# handles the write, so the cache has to be shared. Contacts written around
+# those views (a shell, a migration) are only seen once the set expires
+FRIENDS_CACHE_SECONDS = 60 * 60
+
+
+def friends_key(user_id):
+    return f"friends:{user_id}"
+
+
+def friend_ids(user):
+    """
+    Frozen set of the ids of user's friends (or the friends of the user with
+    that id), from the cache when no accept, unadd or block touched it since
+    it was last read from the database. Refuses to run on a cache private to
+    this process.
+    """
+    require_shared_cache("Friend sets")
+    user_id = getattr(user, "pk", user)
+    ids = cache.get(friends_key(user_id))
+    if ids is None:
+        ids = frozenset(
+            other
+            for pair in Contact.objects.friendships(user_id).values_list(
+                "userA_id", "userB_id"
+            )
+            for other in pair
+        ) - {user_id}
+        cache.set(friends_key(user_id), ids, FRIENDS_CACHE_SECONDS)
+    return ids
+
+
+def invalidate_friend_ids(user_ids):
+    """
+    Drop the cached friend sets of user_ids once the current transaction
+    commits, so a concurrent read cannot cache the set from before the write.
+    """
+    keys = [friends_key(user_id) for user_id in set(user_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,47 @@
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from Contacts.suggestions import refresh_suggestions
+from OneOnOne.caches import require_shared_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the people-you-may-know suggestions of every active user "
+        "and store them in the cache the suggestions endpoint reads"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of users whose suggestions are computed together",
+        )
+
+    def handle(self, *args, **options):
+        # A per-process cache would be gone with this process, before the
+        # server could read anything from it
+        try:
+            require_shared_cache("Contact suggestions")
+        except ImproperlyConfigured as error:
+            raise CommandError(str(error))
+
+        batch_size = options["batch_size"]
+        user_ids = list(
+            User.objects.filter(is_active=True)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+
+        suggested = 0
+        for start in range(0, len(user_ids), batch_size):
+            suggestions = refresh_suggestions(user_ids[start : start + batch_size])
+            suggested += sum(1 for ranked in suggestions.values() if ranked)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Refreshed suggestions of {len(user_ids)} users, "
+                f"{suggested} of them have some."
+            )
+        )
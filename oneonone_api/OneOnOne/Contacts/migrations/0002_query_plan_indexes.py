@@ -0,0 +1,23 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Contacts', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['userB', 'status'], name='contact_userb_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['userA', 'status'], name='contact_usera_status_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:10
+
+from django.db import migrations
+
+# Expression indexes on auth_user backing the prefix ranges of the contact
+# search, created with SQL since auth.User is not a model of this app
+SEARCH_FIELDS = ['username', 'first_name', 'last_name', 'email']
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Contacts', '0002_query_plan_indexes'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=f'CREATE INDEX contacts_user_{field}_lower_idx ON auth_user (LOWER({field}))',
+            reverse_sql=f'DROP INDEX contacts_user_{field}_lower_idx',
+        )
+        for field in SEARCH_FIELDS
+    ]
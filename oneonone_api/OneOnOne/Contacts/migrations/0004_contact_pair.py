@@ -0,0 +1,68 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Which of two mirrored rows for the same pair survives, a block first so
+# nobody gets unblocked by the migration, then a friendship
+STATUS_PRIORITY = {4: 0, 1: 1, 2: 2, 3: 3}
+
+
+def fill_pairs(apps, schema_editor):
+    Contact = apps.get_model('Contacts', 'Contact')
+    kept = {}
+    duplicates = []
+    # Newest first, so among rows of the same status the latest one is kept
+    for contact in Contact.objects.order_by('-id'):
+        contact.user_low_id, contact.user_high_id = sorted((contact.userA_id, contact.userB_id))
+        key = (contact.user_low_id, contact.user_high_id)
+        other = kept.get(key)
+        if other is None or STATUS_PRIORITY[contact.status] < STATUS_PRIORITY[other.status]:
+            kept[key] = contact
+            if other is not None:
+                duplicates.append(other.id)
+        else:
+            duplicates.append(contact.id)
+    Contact.objects.filter(id__in=duplicates).delete()
+    Contact.objects.bulk_update(kept.values(), ['user_low', 'user_high'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Contacts', '0003_user_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contact',
+            name='user_low',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='contact',
+            name='user_high',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(fill_pairs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='contact',
+            name='user_low',
+            field=models.ForeignKey(db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='contact',
+            name='user_high',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='contact',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='contact',
+            constraint=models.UniqueConstraint(fields=('user_low', 'user_high'), name='contact_pair_unique'),
+        ),
+    ]
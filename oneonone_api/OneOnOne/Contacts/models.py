@@ -1,11 +1,91 @@
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Greatest, Least
 from django.contrib.auth.models import User
 
+SIDES = ('userA', 'userB')
+
+
+class ContactQuerySet(models.QuerySet):
+    #the bulk writes skip save(), they fill in the ordered pair themselves
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for contact in objs:
+            contact.fill_pair()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        if set(SIDES) & set(fields):
+            for contact in objs:
+                contact.fill_pair()
+            fields = [*fields, 'user_low', 'user_high']
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def update(self, **kwargs):
+        """
+        update() that keeps user_low and user_high in step when userA or
+        userB is set, ordering each row's new pair in the database.
+        """
+        sides = {
+            side: kwargs[key]
+            for side in SIDES
+            for key in (side, f'{side}_id')
+            if key in kwargs
+        }
+        if sides:
+            a, b = (
+                getattr(sides[side], 'pk', sides[side]) if side in sides else F(f'{side}_id')
+                for side in SIDES
+            )
+            kwargs['user_low'] = Least(a, b)
+            kwargs['user_high'] = Greatest(a, b)
+        return super().update(**kwargs)
+
+    #the lookups behind the friends, incoming and outgoing lists, each one read off an index
+    def friendships(self, user):
+        return self.filter(models.Q(userA=user) | models.Q(userB=user), status=1)
+
+    def incoming(self, user):
+        return self.filter(userB=user, status=2)
+
+    def outgoing(self, user):
+        return self.filter(userA=user, status=2)
+
+
 class Contact(models.Model):
     #could add more later, this seems sufficient for now
     STATUS_CHOICES = [(1, 'Friends'),(2, 'Pending'),(3, 'Rejected'),(4, 'Blocked'),] 
+    #userA started the relationship (sent the request, or blocked the other side, which takes it over), userB is the other side
     userA = models.ForeignKey(User, related_name='userA_contacts', on_delete=models.CASCADE)
     userB = models.ForeignKey(User, related_name='userB_contacts', on_delete=models.CASCADE)
+    #the same two users ordered by id, filled in by fill_pair() on every write so both directions share one key
+    user_low = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE, editable=False, db_index=False)
+    user_high = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE, editable=False)
     status = models.IntegerField(choices=STATUS_CHOICES)
+    objects = ContactQuerySet.as_manager()
     class Meta:
-        unique_together = ('userA', 'userB') #cannot have 2 pairs of same people with A/B swapped
+        constraints = [
+            #cannot have 2 pairs of same people with A/B swapped
+            models.UniqueConstraint(fields=['user_low', 'user_high'], name='contact_pair_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['userB', 'status'], name='contact_userb_status_idx'),
+            models.Index(fields=['userA', 'status'], name='contact_usera_status_idx'),
+        ]
+
+    @staticmethod
+    def pair(a, b):
+        """
+        Lookup kwargs for the contact between users (or user ids) a and b
+        whichever of them started it, a single probe of contact_pair_unique.
+        """
+        a_id, b_id = sorted((getattr(a, 'pk', a), getattr(b, 'pk', b)))
+        return {'user_low_id': a_id, 'user_high_id': b_id}
+
+    def fill_pair(self):
+        self.user_low_id, self.user_high_id = sorted((self.userA_id, self.userB_id))
+
+    def save(self, *args, **kwargs):
+        self.fill_pair()
+        super().save(*args, **kwargs)
@@ -0,0 +1,96 @@
+import hashlib
+import string
+from functools import reduce
+from operator import or_
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Q
+from django.db.models.functions import Lower
+from .models import Contact
+
+# Fields a query is matched against, each backed by a LOWER() index on
+# auth_user (see migration 0003_user_search_indexes)
+SEARCH_FIELDS = ("username", "first_name", "last_name", "email")
+SEARCH_DEFAULT_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
+# Typing and backspacing repeats the same prefixes, a new user or a renamed
+# one only shows up in them after this long
+SEARCH_CACHE_SECONDS = 30
+# Sorts after any character a prefix can be followed by
+PREFIX_END = chr(0x10FFFF)
+# SQLite's LOWER() only folds A-Z, queries are folded the same way so that a
+# non-ASCII letter compares with the stored one unchanged
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def fold(text):
+    """text lowercased the way LOWER() lowercases the indexed fields."""
+    return text.translate(ASCII_LOWER)
+
+
+def matching_users(prefix):
+    """
+    Users with a field starting with prefix, folded with fold. Every field is
+    matched with a range on its LOWER() index, which unlike LIKE or icontains
+    can seek straight to the prefix.
+    """
+    lowered = {f"{field}_lower": Lower(field) for field in SEARCH_FIELDS}
+    return User.objects.alias(**lowered).filter(
+        reduce(
+            or_,
+            (
+                Q(**{f"{alias}__gte": prefix, f"{alias}__lt": prefix + PREFIX_END})
+                for alias in lowered
+            ),
+        )
+    )
+
+
+def prefix_matches(prefix, limit):
+    """(id, username) of the first limit users by username matching prefix."""
+    return list(
+        matching_users(prefix).order_by("username").values_list("id", "username")[
+            :limit
+        ]
+    )
+
+
+def blocked_user_ids(user):
+    """Ids of the users user blocked or was blocked by."""
+    return {
+        other
+        for pair in Contact.objects.filter(
+            Q(userA=user) | Q(userB=user), status=4
+        ).values_list("userA_id", "userB_id")
+        for other in pair
+    } - {user.id}
+
+
+def search_users(user, query, limit):
+    """
+    Up to limit users matching query for user to add, without user and the
+    users on either side of a block with them.
+
+    The matches of a prefix are shared by everyone and cached, the blocks are
+    looked up per call. When the cached matches were cut at SEARCH_MAX_LIMIT
+    and filtering left too few of them, the database is asked again.
+    """
+    prefix = fold(query.strip())
+    if not prefix:
+        return []
+    # Hashed since a query may hold characters cache backends reject in keys
+    key = "user-search:" + hashlib.sha256(prefix.encode()).hexdigest()
+    matches = cache.get(key)
+    if matches is None:
+        matches = prefix_matches(prefix, SEARCH_MAX_LIMIT)
+        cache.set(key, matches, SEARCH_CACHE_SECONDS)
+
+    hidden = blocked_user_ids(user) | {user.id}
+    results = [(pk, username) for pk, username in matches if pk not in hidden]
+    if len(results) < limit and len(matches) == SEARCH_MAX_LIMIT:
+        results = [
+            (pk, username)
+            for pk, username in prefix_matches(prefix, SEARCH_MAX_LIMIT + len(hidden))
+            if pk not in hidden
+        ]
+    return [{"id": pk, "username": username} for pk, username in results[:limit]]
@@ -5,3 +5,14 @@ class ContactSerializer(serializers.ModelSerializer):
     class Meta:
         model = Contact
         fields = ['id', 'userA', 'userB', 'status']
+
+    def validate(self, attrs):
+        #contact_pair_unique is on the hidden ordered pair, so DRF does not check it
+        userA = attrs.get('userA', getattr(self.instance, 'userA', None))
+        userB = attrs.get('userB', getattr(self.instance, 'userB', None))
+        existing = Contact.objects.filter(**Contact.pair(userA, userB))
+        if self.instance is not None:
+            existing = existing.exclude(pk=self.instance.pk)
+        if existing.exists():
+            raise serializers.ValidationError('A contact between these users already exists.')
+        return attrs
@@ -0,0 +1,128 @@
+from collections import Counter, defaultdict
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from OneOnOne.caches import require_shared_cache
+from .models import Contact
+
+SUGGESTIONS_LIMIT = 20
+# Kept fresh by the refresh_contact_suggestions command and dropped for the
+# users an accept, unadd or block changes the friends of. The timeout bounds
+# how stale the rest get when the command stops running
+SUGGESTIONS_CACHE_SECONDS = 24 * 60 * 60
+# Ids per IN (...) list, well under SQLite's bound parameter limit
+QUERY_CHUNK_SIZE = 500
+
+
+def suggestions_key(user_id):
+    return f"suggestions:{user_id}"
+
+
+def contact_adjacency(user_ids, **filters):
+    """
+    {user_id: ids of the users on the other side of their contacts} for
+    user_ids, over the contacts matching filters. One query per chunk of
+    QUERY_CHUNK_SIZE users.
+    """
+    user_ids = list(user_ids)
+    adjacency = defaultdict(set)
+    for start in range(0, len(user_ids), QUERY_CHUNK_SIZE):
+        chunk = user_ids[start : start + QUERY_CHUNK_SIZE]
+        for userA_id, userB_id in Contact.objects.filter(
+            Q(userA__in=chunk) | Q(userB__in=chunk), **filters
+        ).values_list("userA_id", "userB_id"):
+            adjacency[userA_id].add(userB_id)
+            adjacency[userB_id].add(userA_id)
+    return adjacency
+
+
+def compute_suggestions(user_ids):
+    """
+    {user_id: [(suggested_id, mutual_friends), ...]} for user_ids, the best
+    SUGGESTIONS_LIMIT friends of their friends ranked by mutual friends, then
+    id. Users sharing any contact with them (friends, pending either way,
+    rejected or blocked) are left out.
+
+    The friend sets of the users, the friend sets of all their friends and
+    the contacts of the users are read once for the whole batch, the ranking
+    is set arithmetic in memory.
+    """
+    user_ids = set(user_ids)
+    friends = contact_adjacency(user_ids, status=1)
+    friends_of_friends = contact_adjacency(
+        set().union(*(friends[user_id] for user_id in user_ids)) - user_ids,
+        status=1,
+    )
+    contacts = contact_adjacency(user_ids)
+
+    suggestions = {}
+    for user_id in user_ids:
+        mutual = Counter()
+        for friend_id in friends[user_id]:
+            # Friends also in the batch were not read again, their friend
+            # sets are already complete in friends
+            mutual.update(
+                friends[friend_id]
+                if friend_id in user_ids
+                else friends_of_friends[friend_id]
+            )
+        for excluded in contacts[user_id] | {user_id}:
+            mutual.pop(excluded, None)
+        suggestions[user_id] = sorted(
+            mutual.items(), key=lambda item: (-item[1], item[0])
+        )[:SUGGESTIONS_LIMIT]
+    return suggestions
+
+
+def refresh_suggestions(user_ids):
+    """
+    Compute and cache the suggestions of user_ids as one batch, in the cache
+    shared with the server processes the endpoint reads them from.
+    """
+    require_shared_cache("Contact suggestions")
+    suggestions = compute_suggestions(user_ids)
+    cache.set_many(
+        {
+            suggestions_key(user_id): ranked
+            for user_id, ranked in suggestions.items()
+        },
+        SUGGESTIONS_CACHE_SECONDS,
+    )
+    return suggestions
+
+
+def invalidate_suggestions(user_ids):
+    """
+    Drop the cached suggestions of user_ids once the current transaction
+    commits, to be computed again from their new friends on the next read.
+    """
+    keys = [suggestions_key(user_id) for user_id in set(user_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_suggestions(user):
+    """
+    People user may know, as dicts in the shape of the friends endpoint plus
+    their mutual friend count. Read from the cache the refresh command fills,
+    computed for user alone on a miss. Users user has added, accepted,
+    rejected or blocked since the last refresh are dropped on the way out.
+    """
+    ranked = cache.get(suggestions_key(user.id))
+    if ranked is None:
+        ranked = refresh_suggestions([user.id])[user.id]
+    excluded = contact_adjacency([user.id])[user.id]
+    ranked = [(pk, mutual) for pk, mutual in ranked if pk not in excluded]
+    users = User.objects.in_bulk([pk for pk, _ in ranked])
+    return [
+        {
+            "id": pk,
+            "username": users[pk].username,
+            "firstName": users[pk].first_name,
+            "lastName": users[pk].last_name,
+            "mutualFriends": mutual,
+        }
+        for pk, mutual in ranked
+        if pk in users
+    ]
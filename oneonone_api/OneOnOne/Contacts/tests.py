@@ -0,0 +1,280 @@
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import override_settings
+from rest_framework.test import APITestCase
+from .friends import friend_ids
+from .models import Contact
+from .suggestions import compute_suggestions, get_suggestions, suggestions_key
+
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+class ContactTestCase(APITestCase):
+    def setUp(self):
+        # Friend sets and search results are cached, by user id and by prefix
+        cache.clear()
+        self.user = User.objects.create(username="user")
+        self.client.force_authenticate(self.user)
+
+
+class SearchTests(ContactTestCase):
+    def search(self, query):
+        response = self.client.get("/contacts/search/", {"q": query})
+        self.assertEqual(response.status_code, 200)
+        return [user["username"] for user in response.json()]
+
+    def test_ascii_case_is_ignored(self):
+        User.objects.create(username="Alice")
+        User.objects.create(username="bob", first_name="ALBERT")
+        self.assertEqual(self.search("al"), ["Alice", "bob"])
+        self.assertEqual(self.search("AL"), ["Alice", "bob"])
+
+    def test_non_ascii_letters_match_as_stored(self):
+        User.objects.create(username="Émile")
+        User.objects.create(username="ÉMILIE")
+        # LOWER() leaves É alone, so the query must not fold it to é either
+        self.assertEqual(self.search("ÉMI"), ["ÉMILIE", "Émile"])
+        self.assertEqual(self.search("Émil"), ["ÉMILIE", "Émile"])
+
+    def test_blocked_users_are_hidden(self):
+        alice = User.objects.create(username="alice")
+        User.objects.create(username="alan")
+        Contact.objects.create(userA=alice, userB=self.user, status=4)
+        self.assertEqual(self.search("al"), ["alan"])
+
+
+class ContactPairTests(ContactTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ann, self.bob, self.cat = User.objects.bulk_create(
+            User(username=username) for username in ("ann", "bob", "cat")
+        )
+
+    def assertPairsInStep(self):
+        for contact in Contact.objects.all():
+            self.assertEqual(
+                (contact.user_low_id, contact.user_high_id),
+                tuple(sorted((contact.userA_id, contact.userB_id))),
+            )
+
+    def test_bulk_create_fills_the_pair(self):
+        Contact.objects.bulk_create(
+            [
+                Contact(userA=self.bob, userB=self.ann, status=2),
+                Contact(userA=self.ann, userB=self.cat, status=1),
+            ]
+        )
+        self.assertPairsInStep()
+        self.assertTrue(Contact.objects.filter(**Contact.pair(self.ann, self.bob)))
+
+    def test_updates_refill_the_pair(self):
+        contact = Contact.objects.create(userA=self.ann, userB=self.bob, status=2)
+        Contact.objects.filter(pk=contact.pk).update(userA=self.cat)
+        self.assertPairsInStep()
+        Contact.objects.filter(pk=contact.pk).update(userB_id=self.ann.id, status=1)
+        self.assertPairsInStep()
+        contact.refresh_from_db()
+        contact.userA = self.bob
+        Contact.objects.bulk_update([contact], ["userA"])
+        self.assertPairsInStep()
+        self.assertTrue(Contact.objects.filter(**Contact.pair(self.ann, self.bob)))
+
+    def test_duplicate_pair_is_rejected(self):
+        Contact.objects.create(userA=self.ann, userB=self.bob, status=2)
+        for userA, userB in ((self.ann, self.bob), (self.bob, self.ann)):
+            response = self.client.post(
+                "/contacts/", {"userA": userA.id, "userB": userB.id, "status": 1}
+            )
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(Contact.objects.count(), 1)
+
+    def test_update_onto_an_existing_pair_is_rejected(self):
+        Contact.objects.create(userA=self.ann, userB=self.bob, status=2)
+        contact = Contact.objects.create(userA=self.ann, userB=self.cat, status=2)
+        url = f"/contacts/{contact.id}/"
+        response = self.client.patch(url, {"userB": self.bob.id})
+        self.assertEqual(response.status_code, 400)
+        # Swapping the sides of the same contact is not a duplicate
+        response = self.client.put(
+            url, {"userA": self.cat.id, "userB": self.ann.id, "status": 1}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertPairsInStep()
+
+
+class BlockTests(ContactTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = User.objects.create(username="other")
+
+    def post(self, action, user=None):
+        if user is not None:
+            self.client.force_authenticate(user)
+        return self.client.post(f"/contacts/{action}/", {"username": "other"})
+
+    def test_blocking_a_request_from_the_other_side(self):
+        Contact.objects.create(userA=self.other, userB=self.user, status=2)
+        self.assertEqual(self.post("block").status_code, 200)
+        contact = Contact.objects.get()
+        self.assertEqual(
+            (contact.userA, contact.userB, contact.status), (self.user, self.other, 4)
+        )
+        self.assertEqual(
+            (contact.user_low_id, contact.user_high_id), (self.user.id, self.other.id)
+        )
+
+    def test_only_the_blocker_can_unblock(self):
+        Contact.objects.create(userA=self.user, userB=self.other, status=1)
+        self.post("block")
+        self.client.force_authenticate(self.other)
+        response = self.client.post("/contacts/unblock/", {"username": "user"})
+        self.assertEqual(response.status_code, 403)
+        # Blocking back leaves the first block in place
+        self.client.post("/contacts/block/", {"username": "user"})
+        self.assertEqual(Contact.objects.get().userA, self.user)
+        response = self.client.post("/contacts/unblock/", {"username": "user"})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.post("unblock", self.user).status_code, 200)
+        self.assertFalse(Contact.objects.exists())
+
+    def test_unblocking_a_user_who_is_not_blocked(self):
+        self.assertEqual(self.post("unblock").status_code, 400)
+        Contact.objects.create(userA=self.user, userB=self.other, status=1)
+        self.assertEqual(self.post("unblock").status_code, 400)
+        self.assertTrue(Contact.objects.exists())
+
+
+class FriendSetTests(ContactTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = User.objects.create(username="other")
+
+    def post(self, action):
+        # The cached sets are dropped once the write commits
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"/contacts/{action}/", {"username": "other"})
+        self.assertEqual(response.status_code, 200)
+
+    def assertFriends(self, friends):
+        ids = {self.user.id: {self.other.id}, self.other.id: {self.user.id}}
+        for user_id, other_ids in ids.items():
+            expected = other_ids if friends else set()
+            # From the cache, as warmed by the previous call
+            with self.assertNumQueries(0):
+                self.assertEqual(friend_ids(user_id), expected)
+
+    def warm(self):
+        friend_ids(self.user)
+        friend_ids(self.other)
+
+    def test_accept(self):
+        Contact.objects.create(userA=self.other, userB=self.user, status=2)
+        self.warm()
+        self.post("accept")
+        self.warm()
+        self.assertFriends(True)
+
+    def test_unadd(self):
+        Contact.objects.create(userA=self.user, userB=self.other, status=1)
+        self.warm()
+        self.post("unadd")
+        self.warm()
+        self.assertFriends(False)
+
+    def test_block(self):
+        Contact.objects.create(userA=self.other, userB=self.user, status=1)
+        self.warm()
+        self.assertFriends(True)
+        self.post("block")
+        self.warm()
+        self.assertFriends(False)
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_per_process_cache_is_refused(self):
+        with self.assertRaises(ImproperlyConfigured):
+            friend_ids(self.user)
+
+
+class SuggestionTests(ContactTestCase):
+    def setUp(self):
+        super().setUp()
+        names = ["ann", "bob", "cat", "dan", "eve", "fay", "pam", "rob", "ben"]
+        users = User.objects.bulk_create(User(username=name) for name in names)
+        self.ann, self.bob, self.cat = users[:3]
+        self.dan, self.eve, self.fay = users[3:6]
+        self.pending, self.rejected, self.blocked = users[6:]
+        # The user is friends with ann, bob and cat. dan and eve are friends
+        # with two of them, fay with one, and each of the users the user has
+        # some other contact with is friends with ann
+        Contact.objects.bulk_create(
+            [
+                *(
+                    Contact(userA=self.user, userB=friend, status=1)
+                    for friend in (self.ann, self.bob, self.cat)
+                ),
+                Contact(userA=self.fay, userB=self.cat, status=1),
+                Contact(userA=self.ann, userB=self.eve, status=1),
+                Contact(userA=self.bob, userB=self.eve, status=1),
+                Contact(userA=self.dan, userB=self.ann, status=1),
+                Contact(userA=self.bob, userB=self.dan, status=1),
+                *(
+                    Contact(userA=self.ann, userB=other, status=1)
+                    for other in (self.pending, self.rejected, self.blocked)
+                ),
+                Contact(userA=self.pending, userB=self.user, status=2),
+                Contact(userA=self.user, userB=self.rejected, status=3),
+                Contact(userA=self.blocked, userB=self.user, status=4),
+            ]
+        )
+
+    def test_ranked_by_mutual_friends(self):
+        response = self.client.get("/contacts/suggestions/")
+        self.assertEqual(response.status_code, 200)
+        # Ties are broken by id, users with any contact are left out
+        self.assertEqual(
+            [(user["username"], user["mutualFriends"]) for user in response.json()],
+            [("dan", 2), ("eve", 2), ("fay", 1)],
+        )
+
+    def test_batch_matches_single_users(self):
+        user_ids = User.objects.values_list("id", flat=True)
+        batch = compute_suggestions(user_ids)
+        for user_id in user_ids:
+            self.assertEqual(batch[user_id], compute_suggestions([user_id])[user_id])
+        # bob through the user, dan and eve, cat through the user
+        self.assertEqual(batch[self.ann.id], [(self.bob.id, 3), (self.cat.id, 1)])
+
+    def test_refresh_command(self):
+        stdout = StringIO()
+        call_command("refresh_contact_suggestions", "--batch-size", "4", stdout=stdout)
+        self.assertIn("Refreshed suggestions of 10 users", stdout.getvalue())
+        user_ids = User.objects.values_list("id", flat=True)
+        expected = compute_suggestions(user_ids)
+        for user_id in user_ids:
+            self.assertEqual(cache.get(suggestions_key(user_id)), expected[user_id])
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_refresh_command_refuses_a_per_process_cache(self):
+        with self.assertRaises(CommandError):
+            call_command("refresh_contact_suggestions", stdout=StringIO())
+
+    def test_contact_writes_drop_the_cached_suggestions(self):
+        for action, username in (("accept", "pam"), ("unadd", "cat"), ("block", "bob")):
+            get_suggestions(self.user)
+            self.assertIsNotNone(cache.get(suggestions_key(self.user.id)))
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    f"/contacts/{action}/", {"username": username}
+                )
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNone(cache.get(suggestions_key(self.user.id)), action)
+        # Friends with ann and pam now, pam brings no one new
+        self.assertEqual(
+            [user["username"] for user in get_suggestions(self.user)], ["dan", "eve"]
+        )
@@ -5,7 +5,11 @@ from rest_framework.response import Response
 from rest_framework.decorators import action
 from .models import Contact
 from .serializers import ContactSerializer
-from django.db.models import Q
+from .search import search_users, SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT
+from .friends import friend_ids, invalidate_friend_ids
+from .suggestions import get_suggestions, invalidate_suggestions
+from django.db import IntegrityError
+from Auth.summary import invalidate_summaries
 
 # to test i made a set of postman queries, and i exported it into postman.json
 # in this folder - just upload it to postman for skeletons of the tests,
@@ -17,6 +21,28 @@ class ContactViewSet(viewsets.ModelViewSet):
     serializer_class = ContactSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    # the plain create/update/destroy routes can move incoming request counts,
+    # friend sets and suggestions
+    def perform_create(self, serializer):
+        contact = serializer.save()
+        invalidate_summaries([contact.userA_id, contact.userB_id])
+        invalidate_friend_ids([contact.userA_id, contact.userB_id])
+        invalidate_suggestions([contact.userA_id, contact.userB_id])
+
+    def perform_update(self, serializer):
+        previous = (serializer.instance.userA_id, serializer.instance.userB_id)
+        contact = serializer.save()
+        users = [*previous, contact.userA_id, contact.userB_id]
+        invalidate_summaries(users)
+        invalidate_friend_ids(users)
+        invalidate_suggestions(users)
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        invalidate_summaries([instance.userA_id, instance.userB_id])
+        invalidate_friend_ids([instance.userA_id, instance.userB_id])
+        invalidate_suggestions([instance.userA_id, instance.userB_id])
+
     # add a user while logged in
     # excludes blocked contacts (from either side) and contacts that already exist
     @action(detail=False, methods=["post"], url_path="add")
@@ -42,9 +68,7 @@ class ContactViewSet(viewsets.ModelViewSet):
                 {"error": "You cannot add yourself."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        contact_exists = Contact.objects.filter(
-            Q(userA=userA, userB=userB) | Q(userA=userB, userB=userA)
-        ).first()
+        contact_exists = Contact.objects.filter(**Contact.pair(userA, userB)).first()
         if contact_exists:
             if contact_exists.status == 4:
                 return Response(
@@ -58,7 +82,15 @@ class ContactViewSet(viewsets.ModelViewSet):
                 )
         else:
             contact = Contact(userA=userA, userB=userB, status=2)
-            contact.save()
+            try:
+                contact.save()
+            except IntegrityError:
+                # the other user added us at the same time
+                return Response(
+                    {"error": "This contact already exists."},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            invalidate_summaries([userB.id])
             serializer = self.get_serializer(contact)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -68,16 +100,7 @@ class ContactViewSet(viewsets.ModelViewSet):
         """
         Get a list of all friends of the current user.
         """
-        user = request.user
-        contacts = Contact.objects.filter(Q(userA=user) | Q(userB=user), status=1)
-        # clean up data to easier to work with in frontend
-        friend_ids = set()
-        for contact in contacts:
-            if contact.userA == user:
-                friend_ids.add(contact.userB_id)
-            elif contact.userB == user:
-                friend_ids.add(contact.userA_id)
-        friends = User.objects.filter(id__in=friend_ids)
+        friends = User.objects.filter(id__in=friend_ids(request.user))
         friends_cleaned = [
             {
                 "id": friend.id,
@@ -97,7 +120,7 @@ class ContactViewSet(viewsets.ModelViewSet):
         Get a list of all incoming pending friend requests for the current user.
         """
         user = request.user
-        contacts = Contact.objects.filter(userB=user, status=2)
+        contacts = Contact.objects.incoming(user)
         # clean up data to easier to work with in frontend
         incoming_ids = [contact.userA_id for contact in contacts]
         incoming_users = User.objects.filter(id__in=incoming_ids)
@@ -113,7 +136,7 @@ class ContactViewSet(viewsets.ModelViewSet):
         Get a list of all outgoing pending friend requests for the current user.
         """
         user = request.user
-        contacts = Contact.objects.filter(userA=user, status=2)
+        contacts = Contact.objects.outgoing(user)
 
         # clean up data to easier to work with in frontend
         incoming_ids = [contact.userB_id for contact in contacts]
@@ -137,7 +160,7 @@ class ContactViewSet(viewsets.ModelViewSet):
             )
         userBlookup = get_object_or_404(User, username=userB_username)
         contact = Contact.objects.filter(
-            userA=userBlookup, userB=request.user, status=2
+            **Contact.pair(userBlookup, request.user), userA=userBlookup, status=2
         ).first()  # will only be one but errors if not a check to make sure its 1
         if not contact:
             return Response(
@@ -146,6 +169,9 @@ class ContactViewSet(viewsets.ModelViewSet):
             )
         contact.status = 1
         contact.save()
+        invalidate_summaries([request.user.id])
+        invalidate_friend_ids([contact.userA_id, contact.userB_id])
+        invalidate_suggestions([contact.userA_id, contact.userB_id])
         return Response({"message": "Friend request accepted."})
 
     # reject logged in users incoming friend request for a specific user
@@ -162,7 +188,7 @@ class ContactViewSet(viewsets.ModelViewSet):
             )
         userBlookup = get_object_or_404(User, username=userB_username)
         contact = Contact.objects.filter(
-            userA=userBlookup, userB=request.user, status=2
+            **Contact.pair(userBlookup, request.user), userA=userBlookup, status=2
         ).first()  # will only be one but errors if not a check to make sure its 1
         if not contact:
             return Response(
@@ -171,10 +197,12 @@ class ContactViewSet(viewsets.ModelViewSet):
             )
         contact.status = 3
         contact.save()
+        invalidate_summaries([request.user.id])
         return Response({"message": "Friend request rejected."})
 
     # logged in user blocks any user
     # if they have no relationship it makes a new one that is blocked
+    # the blocker always ends up as userA, so only they can unblock
     @action(detail=False, methods=["post"], url_path="block")
     def block(self, request):
         """
@@ -187,21 +215,24 @@ class ContactViewSet(viewsets.ModelViewSet):
             )
         userBlookup = get_object_or_404(User, username=userB_username)
         contact = Contact.objects.filter(
-            (
-                Q(userA=userBlookup, userB=request.user)
-                | Q(userA=request.user, userB=userBlookup)
-            )
+            **Contact.pair(userBlookup, request.user)
         ).first()  # will only be one but errors if not a check to make sure its 1
         if (
             not contact
         ):  # no relationship - make new one thats blocked (searching + blocking)
             contact = Contact(userA=request.user, userB=userBlookup, status=4)
-        else:  # friends or pending or rejected -> blocked
+        elif contact.status == 4:  # already blocked, by either side
+            return Response({"message": "User blocked successfully."})
+        else:  # friends or pending or rejected -> blocked, whoever started it
+            contact.userA, contact.userB = request.user, userBlookup
             contact.status = 4
         contact.save()
+        invalidate_summaries([contact.userA_id, contact.userB_id])
+        invalidate_friend_ids([contact.userA_id, contact.userB_id])
+        invalidate_suggestions([contact.userA_id, contact.userB_id])
         return Response({"message": "User blocked successfully."})
 
-    # logged in user unblocks a blocked user, deleting their relationship
+    # logged in user unblocks a user they blocked, deleting their relationship
     @action(detail=False, methods=["post"], url_path="unblock")
     def unblock(self, request):
         """
@@ -214,16 +245,18 @@ class ContactViewSet(viewsets.ModelViewSet):
             )
         userBlookup = get_object_or_404(User, username=userB_username)
         contact = Contact.objects.filter(
-            (
-                Q(userA=userBlookup, userB=request.user)
-                | Q(userA=request.user, userB=userBlookup)
-            )
+            **Contact.pair(userBlookup, request.user)
         ).first()  # will only be one but errors if not a check to make sure its 1
-        if not contact:
+        if not contact or contact.status != 4:
             return Response(
                 {"error": "User is not blocked."}, status=status.HTTP_400_BAD_REQUEST
             )
-        elif contact.status == 4:
+        elif contact.userA_id != request.user.id:
+            return Response(
+                {"error": "Only the user who blocked can unblock."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        else:
             contact.delete()
             return Response({"message": "User unblocked successfully."})
 
@@ -240,10 +273,7 @@ class ContactViewSet(viewsets.ModelViewSet):
             )
         userBlookup = get_object_or_404(User, username=userB_username)
         contact = Contact.objects.filter(
-            (
-                Q(userA=userBlookup, userB=request.user)
-                | Q(userA=request.user, userB=userBlookup)
-            )
+            **Contact.pair(userBlookup, request.user)
         ).first()  # will only be one but errors if not a check to make sure its 1
         if not contact:
             return Response(
@@ -252,15 +282,38 @@ class ContactViewSet(viewsets.ModelViewSet):
             )
         elif contact.status == 1 or contact.status == 2 or contact.status == 3:
             contact.delete()
+            invalidate_summaries([contact.userA_id, contact.userB_id])
+            invalidate_friend_ids([contact.userA_id, contact.userB_id])
+            invalidate_suggestions([contact.userA_id, contact.userB_id])
             return Response({"message": "User unadded successfully."})
 
-    # quality of life get request to make getting all the available users easier
-    # will be used to help autofill search bars etc. for when adding new friends
+    # typeahead for the search bar when adding new friends, matches the start
+    # of the username, first name, last name or email
     @action(detail=False, methods=["get"], url_path="search")
     def search(self, request):
         """
-        Get list of all people other than the current user.
+        Get up to `limit` (default 10, at most 50) users other than the current
+        user whose username, name or email starts with `q`, skipping users on
+        either side of a block with them.
+        """
+        try:
+            limit = int(request.query_params.get("limit", SEARCH_DEFAULT_LIMIT))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= SEARCH_MAX_LIMIT:
+            return Response(
+                {"error": f"Limit must be between 1 and {SEARCH_MAX_LIMIT}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(
+            search_users(request.user, request.query_params.get("q", ""), limit)
+        )
+
+    # people you may know, friends of friends ranked by mutual friends
+    @action(detail=False, methods=["get"], url_path="suggestions")
+    def suggestions(self, request):
+        """
+        Get up to 20 users the current user may know: friends of their friends
+        they have no contact with yet, most mutual friends first.
         """
-        users = User.objects.exclude(id=request.user.id)
-        users_cleaned = [{"id": user.id, "username": user.username} for user in users]
-        return Response(users_cleaned)
+        return Response(get_suggestions(request.user))
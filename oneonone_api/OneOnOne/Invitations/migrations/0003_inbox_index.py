@@ -0,0 +1,17 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Invitations', '0002_alter_invitation_unique_together'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invitation',
+            index=models.Index(fields=['invitee', 'status', '-id'], name='invitation_inbox_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Calendars', '0007_calendar_changes'),
+        ('Invitations', '0003_inbox_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invitation',
+            index=models.Index(fields=['calendar', 'invitee', '-updated_at'], name='invitation_calendar_idx'),
+        ),
+    ]
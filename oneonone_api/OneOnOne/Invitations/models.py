@@ -12,17 +12,24 @@ class Invitation(models.Model):
     inviter = models.ForeignKey(
         User, related_name="sent_invitations", on_delete=models.CASCADE
     )
-    status = models.CharField(
-        max_length=30,
-        choices=[
-            ("pending", "Pending"),
-            ("accepted", "Accepted"),
-            ("rejected", "Rejected"),
-        ],
-        default="pending",
-    )
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("accepted", "Accepted"),
+        ("rejected", "Rejected"),
+    ]
+    status = models.CharField(max_length=30, choices=STATUS_CHOICES, default="pending")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["-updated_at"]
+        indexes = [
+            models.Index(
+                fields=["invitee", "status", "-id"],
+                name="invitation_inbox_idx",
+            ),
+            models.Index(
+                fields=["calendar", "invitee", "-updated_at"],
+                name="invitation_calendar_idx",
+            ),
+        ]
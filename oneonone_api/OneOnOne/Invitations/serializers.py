@@ -6,9 +6,12 @@ from rest_framework.exceptions import PermissionDenied
 from drf_spectacular.utils import (
     extend_schema_field,
 )
-from Calendars.models import Participant
-from Contacts.models import Contact
-from django.db.models import Q
+from Calendars.models import Calendar, Participant, Membership
+from Contacts.friends import friend_ids
+from collections import defaultdict
+from django.db import transaction
+from django.utils import timezone
+from Auth.summary import invalidate_summaries
 
 
 class InvitationCreateSerializer(serializers.ModelSerializer):
@@ -33,10 +36,7 @@ class InvitationCreateSerializer(serializers.ModelSerializer):
         if calendar.creator == invitee:
             raise PermissionDenied("You cannot send an invitation to yourself.")
         # Check if the invitee is a friend of the inviter
-        if not Contact.objects.filter(
-            Q(userA=calendar.creator, userB=invitee)
-            | Q(userA=invitee, userB=calendar.creator)
-        ).exists():
+        if invitee.id not in friend_ids(calendar.creator):
             raise PermissionDenied("You can only send invitations to friends.")
 
         # Check if an invitation already exists with statuses 'pending' or if the user is already a participant of the calendar
@@ -58,6 +58,167 @@ class InvitationCreateSerializer(serializers.ModelSerializer):
         return invitation
 
 
+def create_invitations(calendar, inviter, usernames):
+    """
+    Invite every username in usernames to calendar, applying the same rules
+    as InvitationCreateSerializer with one query per rule for the whole list
+    and a single bulk INSERT. Returns one result per distinct username,
+    holding either the new invitation id or why it was not sent.
+    """
+    if inviter != calendar.creator:
+        raise PermissionDenied("Only the calendar creator can send invitations.")
+
+    usernames = list(dict.fromkeys(usernames))
+    users = {
+        user.username: user for user in User.objects.filter(username__in=usernames)
+    }
+    friends = friend_ids(calendar.creator)
+    pending = set(
+        Invitation.objects.filter(
+            calendar=calendar, invitee__in=users.values(), status="pending"
+        ).values_list("invitee_id", flat=True)
+    )
+    participants = set(
+        Participant.objects.filter(
+            calendar=calendar, user__in=users.values()
+        ).values_list("user_id", flat=True)
+    )
+
+    results = []
+    invitations = []
+    for username in usernames:
+        user = users.get(username)
+        if user is None:
+            error = "User does not exist."
+        elif user == calendar.creator:
+            error = "You cannot send an invitation to yourself."
+        elif user.id not in friends:
+            error = "You can only send invitations to friends."
+        elif user.id in pending:
+            error = "An invitation has already been sent to that user."
+        elif user.id in participants:
+            error = "This user is already a participant of this calendar."
+        else:
+            invitations.append(
+                Invitation(
+                    calendar=calendar, inviter=inviter, invitee=user, status="pending"
+                )
+            )
+            results.append({"username": username, "id": None})
+            continue
+        results.append({"username": username, "error": error})
+
+    Invitation.objects.bulk_create(invitations)
+    invalidate_summaries(invitation.invitee_id for invitation in invitations)
+    invitations = iter(invitations)
+    for result in results:
+        if "error" not in result:
+            result["id"] = next(invitations).id
+    return results
+
+
+def respond_to_invitations(invitee, responses):
+    """
+    Apply invitee's {invitation_id: status} answers in one transaction. An
+    accepted invitation makes invitee a participant of its calendar; any
+    other status rejects it. The invitations are locked while answered and
+    participants are inserted ignoring conflicts, so concurrent answers to
+    the same calendar cannot fail on the (user, calendar) constraint.
+    Returns one result per id, holding the new status or why it was not
+    answered.
+    """
+    with transaction.atomic():
+        invitations = Invitation.objects.select_for_update().in_bulk(
+            list(responses)
+        )
+        results = []
+        answered = {"accepted": [], "rejected": []}
+        for invitation_id, status in responses.items():
+            invitation = invitations.get(invitation_id)
+            if invitation is None or invitation.invitee_id != invitee.id:
+                results.append({"id": invitation_id, "error": "Not found."})
+            elif invitation.status in ["accepted", "rejected"]:
+                results.append(
+                    {
+                        "id": invitation_id,
+                        "error": "This invitation has already been responded to.",
+                    }
+                )
+            else:
+                status = "accepted" if status == "accepted" else "rejected"
+                answered[status].append(invitation)
+                results.append({"id": invitation_id, "status": status})
+
+        now = timezone.now()
+        for status, group in answered.items():
+            Invitation.objects.filter(
+                id__in=[invitation.id for invitation in group]
+            ).update(status=status, updated_at=now)
+
+        # Add invitee as a participant to the calendars accepted
+        calendar_ids = {invitation.calendar_id for invitation in answered["accepted"]}
+        Participant.objects.bulk_create(
+            [
+                Participant(user=invitee, calendar_id=calendar_id)
+                for calendar_id in calendar_ids
+            ],
+            ignore_conflicts=True,
+        )
+        Membership.objects.bulk_create(
+            [
+                Membership(user=invitee, calendar_id=calendar_id, role="participant")
+                for calendar_id in calendar_ids
+            ],
+            ignore_conflicts=True,
+        )
+
+        changed = defaultdict(lambda: defaultdict(list))
+        for invitation in answered["accepted"] + answered["rejected"]:
+            changed[invitation.calendar_id]["invitation"].append(invitation.id)
+        for calendar_id, participant_id in Participant.objects.filter(
+            user=invitee, calendar_id__in=calendar_ids
+        ).values_list("calendar_id", "id"):
+            changed[calendar_id]["participant"].append(participant_id)
+        if changed:
+            invalidate_summaries([invitee.id])
+            Calendar.bump_versions(
+                {
+                    calendar_id: (calendar_changed, None)
+                    for calendar_id, calendar_changed in changed.items()
+                }
+            )
+    return results
+
+
+class InvitationResponseSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=["accepted", "rejected"])
+
+
+class InvitationBatchRespondSerializer(serializers.Serializer):
+    responses = InvitationResponseSerializer(
+        many=True, allow_empty=False, max_length=500
+    )
+
+
+class InvitationRespondResultSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    status = serializers.CharField(required=False)
+    error = serializers.CharField(required=False)
+
+
+class InvitationBatchCreateSerializer(serializers.Serializer):
+    invitee_usernames = serializers.ListField(
+        child=serializers.CharField(), allow_empty=False, max_length=500
+    )
+
+
+class InvitationBatchResultSerializer(serializers.Serializer):
+    username = serializers.CharField()
+    id = serializers.IntegerField(required=False)
+    error = serializers.CharField(required=False)
+
+
 class InvitationEditSerializer(serializers.ModelSerializer):
     class Meta:
         model = Invitation
@@ -112,3 +273,28 @@ class InvitationSerializer(serializers.ModelSerializer):
             "status",
             "updated_at",
         ]
+
+
+class FriendInvitationStatusSerializer(serializers.Serializer):
+    calendar_id = serializers.SerializerMethodField()
+    username = serializers.CharField()
+    firstName = serializers.CharField(source="first_name")
+    lastName = serializers.CharField(source="last_name")
+    email = serializers.EmailField()
+    status = serializers.ChoiceField(
+        choices=["pending", "accepted", "rejected", "notInvited"],
+        help_text="Status of the friend's latest invitation to the calendar",
+    )
+
+    def get_calendar_id(self, obj) -> int:
+        return self.context["calendar"].id
+
+
+class InboxInvitationSerializer(serializers.ModelSerializer):
+    calendar = serializers.CharField(source="calendar.title")
+    calendar_id = serializers.IntegerField()
+    inviter = serializers.CharField(source="inviter.username")
+
+    class Meta:
+        model = Invitation
+        fields = ["id", "calendar", "calendar_id", "inviter", "status", "updated_at"]
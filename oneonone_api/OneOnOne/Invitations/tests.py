@@ -0,0 +1,351 @@
+from datetime import datetime, timedelta, timezone
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from Calendars.models import Calendar, CalendarChange, Membership
+from Contacts.friends import friend_ids
+from Contacts.models import Contact
+from .models import Invitation
+from .views import friend_statuses
+
+
+class InvitationTestCase(APITestCase):
+    def setUp(self):
+        # Friend sets and summaries are cached by user id, which rolled back
+        # tests hand out again
+        cache.clear()
+        self.creator = User.objects.create(username="creator")
+        self.calendar = Calendar.objects.create(
+            title="Invitations", description="", creator=self.creator
+        )
+        Membership.objects.create(
+            user=self.creator, calendar=self.calendar, role="creator"
+        )
+
+    def make_friends(self, prefix, count):
+        friends = User.objects.bulk_create(
+            User(username=f"{prefix}-{index}") for index in range(count)
+        )
+        for friend in friends:
+            Contact.objects.create(userA=self.creator, userB=friend, status=1)
+        return friends
+
+
+class InboxTests(InvitationTestCase):
+    def setUp(self):
+        super().setUp()
+        self.invitee = User.objects.create(username="invitee")
+        self.client.force_authenticate(self.invitee)
+        self.pending, self.accepted = Invitation.objects.bulk_create(
+            Invitation(
+                calendar=self.calendar,
+                invitee=self.invitee,
+                inviter=self.creator,
+                status=status,
+            )
+            for status in ("pending", "accepted")
+        )
+
+    def get_inbox(self, query=""):
+        return self.client.get("/calendars/invitations/" + query)
+
+    def inbox_ids(self, query=""):
+        response = self.get_inbox(query)
+        self.assertEqual(response.status_code, 200)
+        return [invitation["id"] for invitation in response.json()["results"]]
+
+    def test_status(self):
+        self.assertEqual(self.inbox_ids(), [self.pending.id])
+        self.assertEqual(self.inbox_ids("?status=accepted"), [self.accepted.id])
+        self.assertEqual(
+            self.inbox_ids("?status=all"), [self.accepted.id, self.pending.id]
+        )
+        self.assertEqual(self.get_inbox("?status=lost").status_code, 400)
+
+    def test_empty_status_is_the_default(self):
+        self.assertEqual(self.inbox_ids("?status="), [self.pending.id])
+
+    def test_since_with_an_unencoded_offset(self):
+        updated_at = self.pending.updated_at.astimezone(
+            timezone(timedelta(hours=2))
+        )
+        before = (updated_at - timedelta(seconds=1)).isoformat()
+        after = (updated_at + timedelta(seconds=1)).isoformat()
+        self.assertIn("+02:00", before)
+        # Sent as typed, the + is decoded to a space
+        self.assertEqual(self.inbox_ids(f"?since={before}"), [self.pending.id])
+        self.assertEqual(self.inbox_ids(f"?since={after}"), [])
+
+    def test_invalid_since(self):
+        self.assertEqual(self.get_inbox("?since=yesterday").status_code, 400)
+        naive = datetime(2000, 1, 1).isoformat()
+        self.assertEqual(self.inbox_ids(f"?since={naive}"), [self.pending.id])
+
+
+class FriendStatusTests(InvitationTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.creator)
+        self.url = f"/calendars/{self.calendar.id}/invitations/"
+        self.pending, self.answered, self.uninvited = self.make_friends("friend", 3)
+        User.objects.create(username="friend-stranger")
+        Invitation.objects.create(
+            calendar=self.calendar, invitee=self.pending, inviter=self.creator
+        )
+        # Invited twice, the latest invitation wins
+        for status, updated_at in (
+            ("accepted", datetime(2030, 1, 2, tzinfo=timezone.utc)),
+            ("rejected", datetime(2030, 1, 1, tzinfo=timezone.utc)),
+        ):
+            invitation = Invitation.objects.create(
+                calendar=self.calendar,
+                invitee=self.answered,
+                inviter=self.creator,
+                status=status,
+            )
+            Invitation.objects.filter(pk=invitation.pk).update(updated_at=updated_at)
+
+    def statuses(self, query=""):
+        response = self.client.get(self.url + query)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_statuses(self):
+        self.assertEqual(
+            [(friend["username"], friend["status"]) for friend in self.statuses()],
+            [
+                ("friend-0", "pending"),
+                ("friend-1", "accepted"),
+                ("friend-2", "notInvited"),
+            ],
+        )
+        self.assertEqual(self.statuses()[0]["calendar_id"], self.calendar.id)
+
+    def test_search(self):
+        User.objects.filter(pk=self.uninvited.pk).update(last_name="Lovelace")
+        self.assertEqual(
+            [friend["username"] for friend in self.statuses("?q=LOVE")], ["friend-2"]
+        )
+        self.assertEqual(
+            [friend["username"] for friend in self.statuses("?q=friend-")],
+            ["friend-0", "friend-1", "friend-2"],
+        )
+        self.assertEqual(self.statuses("?q=stranger"), [])
+
+    def test_page_size(self):
+        first = self.statuses("?page_size=2")
+        self.assertEqual(
+            [friend["username"] for friend in first["results"]],
+            ["friend-0", "friend-1"],
+        )
+        second = self.client.get(first["next"]).json()
+        self.assertEqual(
+            [friend["username"] for friend in second["results"]], ["friend-2"]
+        )
+        self.assertIsNone(second["next"])
+
+    def test_only_the_creator(self):
+        self.client.force_authenticate(self.pending)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_one_query(self):
+        friend_ids(self.creator)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(friend_statuses(self.creator, self.calendar)), 3)
+        # The calendar and its friends, however many of them there are
+        for count in (0, 20):
+            self.make_friends(f"more-{count}", count)
+            cache.clear()
+            friend_ids(self.creator)
+            with self.assertNumQueries(2):
+                self.statuses()
+
+
+class BatchCreateTests(InvitationTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.creator)
+        self.url = f"/calendars/{self.calendar.id}/invitations/"
+
+    def invite(self, usernames):
+        return self.client.post(
+            self.url, {"invitee_usernames": usernames}, format="json"
+        )
+
+    def test_results(self):
+        friend, invited = self.make_friends("friend", 2)
+        User.objects.create(username="stranger")
+        Invitation.objects.create(
+            calendar=self.calendar, invitee=invited, inviter=self.creator
+        )
+        response = self.invite(
+            [friend.username, friend.username, invited.username]
+            + ["stranger", "nobody", "creator"]
+        )
+        self.assertEqual(response.status_code, 201)
+        results = response.json()
+        created = Invitation.objects.get(invitee=friend)
+        self.assertEqual(
+            results,
+            [
+                {"username": friend.username, "id": created.id},
+                {
+                    "username": invited.username,
+                    "error": "An invitation has already been sent to that user.",
+                },
+                {
+                    "username": "stranger",
+                    "error": "You can only send invitations to friends.",
+                },
+                {"username": "nobody", "error": "User does not exist."},
+                {
+                    "username": "creator",
+                    "error": "You cannot send an invitation to yourself.",
+                },
+            ],
+        )
+        # One version for the whole batch
+        self.calendar.refresh_from_db()
+        self.assertEqual(self.calendar.version, 2)
+        self.assertEqual(
+            list(CalendarChange.objects.values_list("kind", "object_id")),
+            [("invitation", created.id)],
+        )
+
+    def test_nothing_created(self):
+        response = self.invite(["nobody"])
+        self.assertEqual(response.status_code, 400)
+        self.calendar.refresh_from_db()
+        self.assertEqual(self.calendar.version, 1)
+
+    def test_friend_check_reads_the_cached_set(self):
+        self.make_friends("friend", 2)
+        friend_ids(self.creator)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {"invitee_username": "friend-0"})
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(self.invite(["friend-1"]).status_code, 201)
+        self.assertFalse(
+            [query for query in queries if "Contacts_contact" in query["sql"]]
+        )
+
+    def test_query_count(self):
+        counts = []
+        for count in (2, 20):
+            friends = self.make_friends(f"friends-{count}", count)
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.invite([friend.username for friend in friends])
+            self.assertEqual(response.status_code, 201)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1], counts)
+
+
+class BatchRespondTests(InvitationTestCase):
+    url = "/calendars/invitations/respond/"
+
+    def setUp(self):
+        super().setUp()
+        self.invitee = User.objects.create(username="invitee")
+        self.client.force_authenticate(self.invitee)
+
+    def make_invitations(self, count, invitee=None):
+        calendars = Calendar.objects.bulk_create(
+            Calendar(title=f"Calendar {index}", description="", creator=self.creator)
+            for index in range(count)
+        )
+        return Invitation.objects.bulk_create(
+            Invitation(
+                calendar=calendar,
+                invitee=invitee or self.invitee,
+                inviter=self.creator,
+            )
+            for calendar in calendars
+        )
+
+    def respond(self, responses):
+        return self.client.post(
+            self.url,
+            {
+                "responses": [
+                    {"id": invitation_id, "status": status}
+                    for invitation_id, status in responses
+                ]
+            },
+            format="json",
+        )
+
+    def test_results(self):
+        accepted, rejected, answered = self.make_invitations(3)
+        answered.status = "rejected"
+        answered.save()
+        (other,) = self.make_invitations(1, invitee=self.creator)
+        response = self.respond(
+            [
+                (accepted.id, "accepted"),
+                (rejected.id, "rejected"),
+                (answered.id, "accepted"),
+                (other.id, "accepted"),
+            ]
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            [
+                {"id": accepted.id, "status": "accepted"},
+                {"id": rejected.id, "status": "rejected"},
+                {
+                    "id": answered.id,
+                    "error": "This invitation has already been responded to.",
+                },
+                {"id": other.id, "error": "Not found."},
+            ],
+        )
+        self.assertEqual(
+            dict(Invitation.objects.values_list("id", "status")),
+            {
+                accepted.id: "accepted",
+                rejected.id: "rejected",
+                answered.id: "rejected",
+                other.id: "pending",
+            },
+        )
+        # Only the accepted calendar gains the invitee
+        self.assertEqual(
+            list(self.invitee.calendar_participations.values_list("calendar_id")),
+            [(accepted.calendar_id,)],
+        )
+        self.assertEqual(
+            list(self.invitee.calendar_memberships.values_list("calendar_id", "role")),
+            [(accepted.calendar_id, "participant")],
+        )
+        self.assertEqual(
+            dict(
+                Calendar.objects.filter(
+                    id__in=[accepted.calendar_id, rejected.calendar_id]
+                ).values_list("id", "version")
+            ),
+            {accepted.calendar_id: 2, rejected.calendar_id: 2},
+        )
+
+    def test_nothing_answered(self):
+        (other,) = self.make_invitations(1, invitee=self.creator)
+        response = self.respond([(other.id, "accepted")])
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_count(self):
+        counts = []
+        for count in (2, 20):
+            invitations = self.make_invitations(count)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.respond(
+                    [
+                        (invitation.id, ("accepted", "rejected")[index % 2])
+                        for index, invitation in enumerate(invitations)
+                    ]
+                )
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1], counts)
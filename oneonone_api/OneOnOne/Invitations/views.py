@@ -4,115 +4,197 @@ from .serializers import (
     InvitationCreateSerializer,
     InvitationEditSerializer,
     InvitationSerializer,
+    FriendInvitationStatusSerializer,
+    InboxInvitationSerializer,
+    InvitationBatchCreateSerializer,
+    InvitationBatchResultSerializer,
+    create_invitations,
+    InvitationBatchRespondSerializer,
+    InvitationRespondResultSerializer,
+    respond_to_invitations,
 )
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q
+from django.contrib.auth.models import User
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+from django.db.models import Q, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from Calendars.models import Calendar
 from django.shortcuts import get_object_or_404
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from drf_spectacular.utils import (
     extend_schema,
     OpenApiResponse,
     extend_schema_view,
+    OpenApiParameter,
+    PolymorphicProxySerializer,
 )
-from Calendars.models import Participant
-from Contacts.models import Contact
-from rest_framework.response import Response
+from Contacts.friends import friend_ids
+from Auth.summary import invalidate_summaries
+from OneOnOne.pagination import NewestFirstCursorPagination, UsernameCursorPagination
+
+
+def friend_statuses(user, calendar, search=None):
+    """
+    user's friends, each annotated with the status of their latest invitation
+    to calendar, in a single query once user's friend set is cached. search
+    keeps the friends with it in their username, first or last name.
+    """
+    latest_status = (
+        Invitation.objects.filter(calendar=calendar, invitee=OuterRef("pk"))
+        .order_by("-updated_at")
+        .values("status")[:1]
+    )
+    friends = User.objects.filter(id__in=friend_ids(user)).annotate(
+        status=Coalesce(Subquery(latest_status), Value("notInvited"))
+    )
+    if search:
+        friends = friends.filter(
+            Q(username__icontains=search)
+            | Q(first_name__icontains=search)
+            | Q(last_name__icontains=search)
+        )
+    return friends.order_by("username", "id")
+
+
+def inbox(user, statuses=None, since=None):
+    """
+    The invitations user received, only those with one of statuses when
+    given and those created or answered after since. Calendar titles and
+    inviter usernames come from the same joined query.
+    """
+    queryset = (
+        Invitation.objects.filter(invitee=user)
+        .select_related("calendar", "inviter")
+        .only(
+            "id",
+            "status",
+            "updated_at",
+            "calendar__id",
+            "calendar__title",
+            "inviter__id",
+            "inviter__username",
+        )
+    )
+    if statuses is not None:
+        queryset = queryset.filter(status__in=statuses)
+    if since is not None:
+        queryset = queryset.filter(updated_at__gt=since)
+    return queryset
 
 
 @extend_schema_view(
     get=extend_schema(
-        description="Retrieve all invitations for a calendar",
+        description="List the creator's friends with the status of their latest "
+        "invitation to a calendar",
         request=None,
-        responses={200: OpenApiResponse(response=InvitationSerializer(many=True))},
+        parameters=[
+            OpenApiParameter(
+                "q", str, description="Filter by username, first or last name"
+            ),
+            OpenApiParameter(
+                "page_size",
+                int,
+                description="Paginate by username with this many friends per page",
+            ),
+        ],
+        responses={
+            200: OpenApiResponse(
+                response=FriendInvitationStatusSerializer(many=True)
+            )
+        },
     ),
 )
 class InvitationListCreateAPIView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
-    serializer_class = InvitationSerializer
-    queryset = Invitation.objects.all()
+    serializer_class = FriendInvitationStatusSerializer
+    pagination_class = UsernameCursorPagination
 
     def get_serializer_class(self):
         if self.request.method == "POST":
             return InvitationCreateSerializer
-        return InvitationSerializer
+        return FriendInvitationStatusSerializer
 
-    def get_queryset(self):
-        calendar_id = self.kwargs.get("calendar_id")
-        calendar = get_object_or_404(Calendar, id=calendar_id)
-        if calendar.creator != self.request.user:
+    def get_calendar(self):
+        calendar = get_object_or_404(Calendar, id=self.kwargs.get("calendar_id"))
+        if calendar.creator_id != self.request.user.id:
             raise PermissionDenied(
                 "You do not have permission to view these invitations."
             )
-        return Invitation.objects.filter(calendar=calendar)
+        return calendar
 
-    def list(self, request, *args, **kwargs):
-        calendar_id = self.kwargs.get("calendar_id")
-        calendar = get_object_or_404(Calendar, id=calendar_id)
-        if calendar.creator != request.user:
-            raise PermissionDenied(
-                "You do not have permission to view these invitations."
-            )
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.method == "GET":
+            context["calendar"] = self.calendar
+        return context
 
-        # Fetch all contacts where the current user is either userA or userB and status is friends (integer 2)
-        contacts = Contact.objects.filter(
-            (Q(userA=request.user) | Q(userB=request.user)) & Q(status="1")
+    def get_queryset(self):
+        return friend_statuses(
+            self.request.user, self.calendar, self.request.query_params.get("q")
         )
-        print("contacts", contacts)
-
-        # Prepare a list to hold the response data
-        data = []
-
-        for contact in contacts:
-            # Determine the username of the contact that is not the current user
-            contact_user = (
-                contact.userB if contact.userA == request.user else contact.userA
-            )
-
-            # Fetch the most recent invitation for the contact for the specified calendar
-            latest_invitation = (
-                Invitation.objects.filter(calendar_id=calendar_id, invitee=contact_user)
-                .order_by("-updated_at")
-                .first()
-            )
 
-            # Prepare the contact data, including the latest invitation status if available
-            contact_data = {
-                "calendar_id": calendar_id,
-                "username": contact_user.username,
-                "firstName": contact_user.first_name,
-                "lastName": contact_user.last_name,
-                "email": (
-                    contact.userB.email
-                    if contact.userA == request.user
-                    else contact.userA.email
-                ),  # Assuming both userA and userB have an email field
-                "status": (
-                    latest_invitation.status if latest_invitation else "notInvited"
-                ),
-            }
-
-            data.append(contact_data)
-
-        return Response(data)
+    def list(self, request, *args, **kwargs):
+        self.calendar = self.get_calendar()
+        return super().list(request, *args, **kwargs)
 
     def perform_create(self, serializer):
         calendar_id = self.kwargs.get("calendar_id")
         calendar = get_object_or_404(Calendar, id=calendar_id)
 
-        serializer.save(
+        invitation = serializer.save(
             calendar=calendar,
             inviter=self.request.user,
             invitee_username=self.request.data["invitee_username"],
             status="pending",
         )
+        Calendar.bump_version(calendar.pk, changed={"invitation": [invitation.pk]})
+        invalidate_summaries([invitation.invitee_id])
+
+    def create_batch(self, request):
+        serializer = InvitationBatchCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        calendar = get_object_or_404(Calendar, id=self.kwargs.get("calendar_id"))
+
+        with transaction.atomic():
+            results = create_invitations(
+                calendar, request.user, serializer.validated_data["invitee_usernames"]
+            )
+            created = [result["id"] for result in results if "error" not in result]
+            if created:
+                Calendar.bump_version(calendar.pk, changed={"invitation": created})
+        return Response(
+            InvitationBatchResultSerializer(results, many=True).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST,
+        )
 
     @extend_schema(
-        description="Create an invitation",
-        request=InvitationCreateSerializer,
-        responses={201: OpenApiResponse(response=InvitationSerializer)},
+        description="Create an invitation, or one per username with "
+        "invitee_usernames, reporting the outcome for each",
+        request=PolymorphicProxySerializer(
+            component_name="InvitationCreateRequest",
+            serializers=[InvitationCreateSerializer, InvitationBatchCreateSerializer],
+            resource_type_field_name=None,
+        ),
+        responses={
+            201: PolymorphicProxySerializer(
+                component_name="InvitationCreateResponse",
+                serializers=[
+                    InvitationSerializer,
+                    InvitationBatchResultSerializer(many=True),
+                ],
+                resource_type_field_name=None,
+                many=False,
+            ),
+            400: OpenApiResponse(response=InvitationBatchResultSerializer(many=True)),
+        },
     )
     def post(self, request, *args, **kwargs):
+        if isinstance(request.data, dict) and "invitee_usernames" in request.data:
+            return self.create_batch(request)
         return self.create(request, *args, **kwargs)
 
 
@@ -153,26 +235,18 @@ class InvitationChangeStatusAPIView(generics.RetrieveUpdateDestroyAPIView):
         return queryset
 
     def perform_update(self, serializer):
-        invitation = self.get_object()
+        invitation = serializer.instance
 
         if invitation.invitee != self.request.user:
             raise PermissionDenied(
                 "You do not have permission to change the status of this invitation."
             )
-        if invitation.status in ["accepted", "rejected"]:
-            raise PermissionDenied("This invitation has already been responded to.")
-        else:
-            if serializer.validated_data["status"] == "accepted":
-                invitation.status = "accepted"
-                serializer.save()
-
-                # Add invitee as a participant to the calendar
-                Participant.objects.create(
-                    user=self.request.user, calendar=invitation.calendar
-                )
-            else:
-                invitation.status = "rejected"
-                serializer.save()
+        (result,) = respond_to_invitations(
+            self.request.user, {invitation.id: serializer.validated_data["status"]}
+        )
+        if "error" in result:
+            raise PermissionDenied(result["error"])
+        invitation.status = result["status"]
         return invitation
 
     def destroy(self, request, *args, **kwargs):
@@ -183,40 +257,105 @@ class InvitationChangeStatusAPIView(generics.RetrieveUpdateDestroyAPIView):
                 "You do not have permission to delete this invitation."
             )
 
-        return super().destroy(request, *args, **kwargs)
+        invitation_id = invitation.pk
+        response = super().destroy(request, *args, **kwargs)
+        Calendar.bump_version(
+            invitation.calendar_id, deleted={"invitation": [invitation_id]}
+        )
+        invalidate_summaries([invitation.invitee_id])
+        return response
+
 
 @extend_schema_view(
     get=extend_schema(
-        description="Retrieve all pending invitations for the current user",
+        description="Retrieve the current user's invitations, newest first",
         request=None,
-        responses={200: OpenApiResponse(response=InvitationSerializer(many=True))},
+        parameters=[
+            OpenApiParameter(
+                "status",
+                str,
+                description="Comma separated statuses to include (default pending), "
+                "or all",
+            ),
+            OpenApiParameter(
+                "since",
+                str,
+                description="Only invitations created or answered after this "
+                "ISO 8601 timestamp",
+            ),
+        ],
+        responses={200: OpenApiResponse(response=InboxInvitationSerializer(many=True))},
     ),
 )
 class InvitationListAPIView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
-    serializer_class = InvitationSerializer
-
-    def list(self, request, *args, **kwargs):
-        user = request.user
-
-        invitations = Invitation.objects.filter(invitee=user, status="pending")
+    serializer_class = InboxInvitationSerializer
+    pagination_class = NewestFirstCursorPagination
+
+    def get_statuses(self):
+        # An empty ?status= is the same as leaving it out
+        statuses = self.request.query_params.get("status") or "pending"
+        if statuses == "all":
+            return None
+        statuses = [status.strip() for status in statuses.split(",") if status.strip()]
+        valid = {choice for choice, _ in Invitation._meta.get_field("status").choices}
+        unknown = set(statuses) - valid
+        if unknown:
+            raise ValidationError(
+                {"status": "Unknown statuses: " + ", ".join(sorted(unknown))}
+            )
+        return statuses
+
+    def get_since(self):
+        since = self.request.query_params.get("since")
+        if since is None:
+            return None
+        try:
+            # A + in an offset left unencoded in the query string arrives as a space
+            value = parse_datetime(since.replace(" ", "+"))
+        except ValueError:
+            value = None
+        if value is None:
+            raise ValidationError({"since": "Must be an ISO 8601 timestamp."})
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value
 
-        print("invitations", invitations)
+    def get_queryset(self):
+        return inbox(self.request.user, self.get_statuses(), self.get_since())
 
-        data = []
 
-        for invitation in invitations:
-            calendar_id = invitation.calendar.id
-            calendar = get_object_or_404(Calendar, id=calendar_id)
+@extend_schema_view(
+    post=extend_schema(
+        description="Accept or reject many of the current user's invitations at once",
+        request=InvitationBatchRespondSerializer,
+        responses={
+            200: OpenApiResponse(
+                response=InvitationRespondResultSerializer(many=True)
+            ),
+            400: OpenApiResponse(
+                response=InvitationRespondResultSerializer(many=True)
+            ),
+        },
+    ),
+)
+class InvitationBatchRespondAPIView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = InvitationBatchRespondSerializer
 
-            data.append(
-                {
-                    "id": invitation.id,
-                    "calendar": calendar.title,
-                    "calendar_id": calendar_id,
-                    "inviter": invitation.inviter.username,
-                    "status": invitation.status,
-                }
-            )
-        
-        return Response(data)
\ No newline at end of file
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results = respond_to_invitations(
+            request.user,
+            {
+                response["id"]: response["status"]
+                for response in serializer.validated_data["responses"]
+            },
+        )
+        answered = any("error" not in result for result in results)
+        return Response(
+            InvitationRespondResultSerializer(results, many=True).data,
+            status=status.HTTP_200_OK if answered else status.HTTP_400_BAD_REQUEST,
+        )
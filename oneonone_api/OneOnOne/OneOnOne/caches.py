@@ -0,0 +1,16 @@
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+
+
+def require_shared_cache(what):
+    """
+    Raise ImproperlyConfigured when the default cache only lives in this
+    process. what is cached there and dropped by writes that other processes
+    make, which a per-process cache would never see.
+    """
+    if isinstance(caches["default"], LocMemCache):
+        raise ImproperlyConfigured(
+            f"{what} need a cache shared between processes, the default cache "
+            "is a LocMemCache."
+        )
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -112,10 +113,45 @@ SPECTACULAR_SETTINGS = {
     "DESCRIPTION": "Backend api for OneOnOne meeting application",
     "VERSION": "1.0.0",
     "SERVE_INCLUDE_SCHEMA": False,
+    # The stored status of an invitation, named apart from the status choices
+    # the invitation serializers accept
+    "ENUM_NAME_OVERRIDES": {
+        "InvitationStateEnum": "Invitations.models.Invitation.STATUS_CHOICES",
+    },
     # OTHER SETTINGS
 }
 
 
+# Live calendar events, the in-process backend only reaches listeners
+# connected to the same server process
+CALENDAR_EVENTS_BACKEND = "Calendars.events.InProcessBackend"
+
+# Holds the summary counters, friend sets, search matches and contact
+# suggestions. Every server process and management command reads and
+# invalidates them, so the cache has to be shared between processes: Redis at
+# REDIS_URL when set, otherwise files under CACHE_DIR, which only reach the
+# processes of this machine. Past MAX_ENTRIES (300 by default) the file cache
+# culls a third of its entries at random, and every write lists the directory
+# to check the limit
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv(
+                "CACHE_DIR", os.path.join(tempfile.gettempdir(), "oneonone-cache")
+            ),
+            "OPTIONS": {"MAX_ENTRIES": 20_000},
+        }
+    }
+
+
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
@@ -19,6 +19,7 @@ from django.contrib import admin
 from django.urls import path
 from django.urls.conf import include
 from drf_spectacular.views import SpectacularSwaggerView, SpectacularJSONAPIView
+from Auth.views import UserSummaryAPIView
 
 
 urlpatterns = [
@@ -30,5 +31,6 @@ urlpatterns = [
     path("auth/", include("Auth.urls")),
     path("calendars/", include("Calendars.urls")),
     path("contacts/", include("Contacts.urls")),
+    path("me/summary/", UserSummaryAPIView.as_view(), name="user-summary"),
     # path("user/", include("User.urls")),
 ]
@@ -0,0 +1,175 @@
+from collections import defaultdict
+from django.db import transaction
+from django.utils import timezone
+from datetime import time
+from Auth.summary import invalidate_summaries
+from Calendars.models import Day
+from .models import (
+    TimeSlot,
+    DayCoverage,
+    AvailabilityMask,
+    BUCKET_MINUTES,
+    BUCKETS_PER_DAY,
+)
+
+
+def slot_mask(start_time, end_time):
+    """
+    Bitmask of the buckets a slot overlaps, bit i being the bucket starting
+    i * BUCKET_MINUTES minutes after midnight.
+    """
+    start = start_time.hour * 60 + start_time.minute
+    end = end_time.hour * 60 + end_time.minute
+    if start >= end:
+        return 0
+    first = start // BUCKET_MINUTES
+    last = min((end - 1) // BUCKET_MINUTES, BUCKETS_PER_DAY - 1)
+    return ((1 << (last - first + 1)) - 1) << first
+
+
+def mask_intervals(mask):
+    """
+    Turn a bitmask back into (start_time, end_time) pairs, one per run of set
+    bits. A run reaching midnight ends at 23:59.
+    """
+    intervals = []
+    bucket = 0
+    while mask >> bucket:
+        if not mask >> bucket & 1:
+            bucket += 1
+            continue
+        start = bucket
+        while mask >> bucket & 1:
+            bucket += 1
+        end = min(bucket * BUCKET_MINUTES, 24 * 60 - 1)
+        start *= BUCKET_MINUTES
+        intervals.append((time(start // 60, start % 60), time(end // 60, end % 60)))
+    return intervals
+
+
+def save_masks(owner, masks):
+    """
+    Store the {day_id: mask} bitmasks of owner, dropping the empty ones.
+    """
+    AvailabilityMask.objects.filter(
+        owner=owner, day_id__in=[day_id for day_id, mask in masks.items() if not mask]
+    ).delete()
+    AvailabilityMask.objects.bulk_create(
+        [
+            AvailabilityMask(
+                owner=owner,
+                day_id=day_id,
+                bits=mask.to_bytes(BUCKETS_PER_DAY // 8, "little"),
+            )
+            for day_id, mask in masks.items()
+            if mask
+        ],
+        update_conflicts=True,
+        unique_fields=["owner", "day"],
+        update_fields=["bits"],
+    )
+
+
+def owner_masks(owner, day_ids):
+    """
+    Map each of day_ids to the buckets covered by owner's timeslots on that day.
+    """
+    masks = dict.fromkeys(day_ids, 0)
+    timeslots = TimeSlot.objects.filter(owner=owner, day_id__in=masks).values_list(
+        "day_id", "start_time", "end_time"
+    )
+    for day_id, start_time, end_time in timeslots:
+        masks[day_id] |= slot_mask(start_time, end_time)
+    return masks
+
+
+def lock_owner_masks(owner, day_ids):
+    """
+    owner_masks taken as the before snapshot of a write to owner's timeslots,
+    inside that write's transaction. The days are locked first, so concurrent
+    writes to them queue up and each delta is measured from what the previous
+    one committed.
+    """
+    day_ids = list(day_ids)
+    list(Day.objects.select_for_update().filter(id__in=day_ids).values_list("pk"))
+    return owner_masks(owner, day_ids)
+
+
+def build_counts(day_ids):
+    """
+    Rebuild the bucket counts of day_ids from the raw timeslot rows.
+    """
+    masks = defaultdict(int)
+    timeslots = TimeSlot.objects.filter(day_id__in=day_ids).values_list(
+        "day_id", "owner_id", "start_time", "end_time"
+    )
+    for day_id, owner_id, start_time, end_time in timeslots:
+        masks[day_id, owner_id] |= slot_mask(start_time, end_time)
+
+    counts = {day_id: [0] * BUCKETS_PER_DAY for day_id in day_ids}
+    for (day_id, _), mask in masks.items():
+        day_counts = counts[day_id]
+        for bucket in range(BUCKETS_PER_DAY):
+            if mask >> bucket & 1:
+                day_counts[bucket] += 1
+    return counts
+
+
+def rebuild_coverage(day_ids):
+    counts = build_counts(day_ids)
+    for day_id, day_counts in counts.items():
+        DayCoverage.objects.update_or_create(
+            day_id=day_id, defaults={"counts": day_counts}
+        )
+    return counts
+
+
+def get_coverage(days):
+    """
+    Return {day_id: counts} for days, building any histogram not stored yet.
+    """
+    day_ids = [day.id for day in days]
+    counts = dict(
+        DayCoverage.objects.filter(day_id__in=day_ids).values_list("day_id", "counts")
+    )
+    missing = [day_id for day_id in day_ids if day_id not in counts]
+    if missing:
+        counts.update(rebuild_coverage(missing))
+    return counts
+
+
+def update_coverage(owner, before):
+    """
+    Apply the change to owner's timeslots since the masks in before were taken
+    with lock_owner_masks in the same transaction, to both the stored masks
+    and the day histograms. Only the buckets that flipped are touched, so the
+    cost does not depend on how many other participants the day has.
+    """
+    after = owner_masks(owner, before.keys())
+    changed = {
+        day_id: old_mask ^ after[day_id]
+        for day_id, old_mask in before.items()
+        if old_mask != after[day_id]
+    }
+    if not changed:
+        return
+
+    with transaction.atomic():
+        save_masks(owner, {day_id: after[day_id] for day_id in changed})
+        # Whether the owner still owes availability to a calendar may have moved
+        invalidate_summaries([owner.id])
+        coverages = list(
+            DayCoverage.objects.select_for_update().filter(day_id__in=changed)
+        )
+        now = timezone.now()
+        for coverage in coverages:
+            flipped = changed.pop(coverage.day_id)
+            for bucket in range(BUCKETS_PER_DAY):
+                if flipped >> bucket & 1:
+                    available = after[coverage.day_id] >> bucket & 1
+                    coverage.counts[bucket] += 1 if available else -1
+            coverage.updated_at = now
+        DayCoverage.objects.bulk_update(coverages, ["counts", "updated_at"])
+        # Days with nothing stored yet, the rebuild already sees the new slots
+        if changed:
+            rebuild_coverage(list(changed))
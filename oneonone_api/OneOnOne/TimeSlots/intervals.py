@@ -0,0 +1,72 @@
+from .models import TimeSlot
+
+
+def coalesce(timeslots, keep=()):
+    """
+    Merge the overlapping or touching timeslots of each (owner, day).
+
+    The batch is sorted once by (owner, day, start_time) and swept in a single
+    pass. Returns (merged, removed): merged holds one timeslot per disjoint
+    interval, reusing the first timeslot of each run (or the one listed in
+    keep) with its bounds widened; removed holds every other timeslot,
+    including empty ones.
+    """
+    ordered = sorted(
+        timeslots,
+        key=lambda timeslot: (
+            timeslot.owner_id,
+            timeslot.day_id,
+            timeslot.start_time,
+            timeslot.end_time,
+        ),
+    )
+    merged = []
+    removed = []
+    for timeslot in ordered:
+        if timeslot.start_time >= timeslot.end_time:
+            removed.append(timeslot)
+            continue
+        current = merged[-1] if merged else None
+        if (
+            current is None
+            or current.owner_id != timeslot.owner_id
+            or current.day_id != timeslot.day_id
+            or timeslot.start_time > current.end_time
+        ):
+            merged.append(timeslot)
+            continue
+        end_time = max(current.end_time, timeslot.end_time)
+        if timeslot in keep and current not in keep:
+            # The kept timeslot takes over the run started by current
+            timeslot.start_time = current.start_time
+            merged[-1] = timeslot
+            removed.append(current)
+            survivor = timeslot
+        else:
+            removed.append(timeslot)
+            survivor = current
+        survivor.end_time = end_time
+    return merged, removed
+
+
+def compact_timeslots(timeslots, keep=()):
+    """
+    Coalesce stored timeslots in place, widening the surviving rows with one
+    bulk UPDATE and deleting the others with one DELETE. Returns the widened
+    and the deleted timeslots.
+    """
+    timeslots = list(timeslots)
+    bounds = {
+        timeslot.pk: (timeslot.start_time, timeslot.end_time)
+        for timeslot in timeslots
+    }
+    merged, removed = coalesce(timeslots, keep)
+    if removed:
+        TimeSlot.objects.filter(pk__in=[timeslot.pk for timeslot in removed]).delete()
+    widened = [
+        timeslot
+        for timeslot in merged
+        if bounds[timeslot.pk] != (timeslot.start_time, timeslot.end_time)
+    ]
+    TimeSlot.objects.bulk_update(widened, ["start_time", "end_time"])
+    return widened, removed
@@ -0,0 +1,65 @@
+from collections import defaultdict
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from Calendars.models import Calendar, Day
+from TimeSlots.intervals import compact_timeslots
+from TimeSlots.models import TimeSlot
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge duplicate, overlapping and touching timeslots of each owner "
+        "and day into the minimal set of disjoint timeslots"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of days compacted per transaction",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        day_ids = list(
+            TimeSlot.objects.order_by("day_id")
+            .values_list("day_id", flat=True)
+            .distinct()
+        )
+
+        removed = 0
+        for start in range(0, len(day_ids), batch_size):
+            batch = day_ids[start : start + batch_size]
+            with transaction.atomic():
+                batch_widened, batch_removed = compact_timeslots(
+                    TimeSlot.objects.filter(day_id__in=batch)
+                )
+                # Row ids changed, clients must not reuse their cached copies
+                calendar_ids = dict(
+                    Day.objects.filter(
+                        id__in={timeslot.day_id for timeslot in batch_removed}
+                    ).values_list("id", "calendar_id")
+                )
+                changes = defaultdict(lambda: {"changed": [], "deleted": []})
+                for timeslot in batch_widened:
+                    changes[calendar_ids[timeslot.day_id]]["changed"].append(
+                        timeslot.pk
+                    )
+                for timeslot in batch_removed:
+                    changes[calendar_ids[timeslot.day_id]]["deleted"].append(
+                        timeslot.pk
+                    )
+                for calendar_id, calendar_changes in changes.items():
+                    Calendar.bump_version(
+                        calendar_id,
+                        changed={"timeslot": calendar_changes["changed"]},
+                        deleted={"timeslot": calendar_changes["deleted"]},
+                    )
+            removed += len(batch_removed)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Removed {removed} redundant timeslots across {len(day_ids)} days."
+            )
+        )
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:20
+
+import TimeSlots.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Calendars', '0002_calendar_final_date_calendar_final_timeslot_end_and_more'),
+        ('TimeSlots', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DayCoverage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('counts', models.JSONField(default=TimeSlots.models.empty_coverage)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('day', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='coverage', to='Calendars.day')),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Calendars', '0006_backfill_memberships'),
+        ('TimeSlots', '0002_daycoverage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvailabilityMask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bits', models.BinaryField(max_length=12)),
+                ('day', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability_masks', to='Calendars.day')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability_masks', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('owner', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:28
+
+from collections import defaultdict
+from django.db import migrations
+
+# Frozen copy of TimeSlots.models.BUCKET_MINUTES and BUCKETS_PER_DAY
+BUCKET_MINUTES = 15
+BUCKETS_PER_DAY = 24 * 60 // BUCKET_MINUTES
+
+
+def backfill_availability_masks(apps, schema_editor):
+    TimeSlot = apps.get_model("TimeSlots", "TimeSlot")
+    AvailabilityMask = apps.get_model("TimeSlots", "AvailabilityMask")
+
+    masks = defaultdict(int)
+    for owner_id, day_id, start_time, end_time in TimeSlot.objects.values_list(
+        "owner_id", "day_id", "start_time", "end_time"
+    ):
+        start = start_time.hour * 60 + start_time.minute
+        end = end_time.hour * 60 + end_time.minute
+        if start >= end:
+            continue
+        first = start // BUCKET_MINUTES
+        last = min((end - 1) // BUCKET_MINUTES, BUCKETS_PER_DAY - 1)
+        masks[owner_id, day_id] |= ((1 << (last - first + 1)) - 1) << first
+    AvailabilityMask.objects.bulk_create(
+        AvailabilityMask(
+            owner_id=owner_id,
+            day_id=day_id,
+            bits=mask.to_bytes(BUCKETS_PER_DAY // 8, "little"),
+        )
+        for (owner_id, day_id), mask in masks.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TimeSlots', '0003_availabilitymask'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_availability_masks, migrations.RunPython.noop),
+    ]
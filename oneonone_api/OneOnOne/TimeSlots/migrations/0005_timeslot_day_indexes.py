@@ -0,0 +1,24 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Calendars', '0006_backfill_memberships'),
+        ('TimeSlots', '0004_backfill_availability_masks'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='timeslot',
+            index=models.Index(fields=['day', 'owner'], name='timeslot_day_owner_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timeslot',
+            index=models.Index(fields=['day', 'start_time'], name='timeslot_day_start_idx'),
+        ),
+    ]
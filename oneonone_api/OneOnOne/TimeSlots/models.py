@@ -10,3 +10,44 @@ class TimeSlot(models.Model):
         User, related_name="created_timeslot", on_delete=models.CASCADE
     )
     day = models.ForeignKey(Day, related_name="timeslots", on_delete=models.CASCADE)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["day", "owner"], name="timeslot_day_owner_idx"),
+            models.Index(fields=["day", "start_time"], name="timeslot_day_start_idx"),
+        ]
+
+
+BUCKET_MINUTES = 15
+BUCKETS_PER_DAY = 24 * 60 // BUCKET_MINUTES
+
+
+def empty_coverage():
+    return [0] * BUCKETS_PER_DAY
+
+
+class DayCoverage(models.Model):
+    # Number of participants available in each bucket of the day,
+    # kept in sync by the timeslot views through TimeSlots.coverage
+    day = models.OneToOneField(Day, related_name="coverage", on_delete=models.CASCADE)
+    counts = models.JSONField(default=empty_coverage)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class AvailabilityMask(models.Model):
+    # The buckets of a day covered by one owner's timeslots, stored next to the
+    # TimeSlot rows as little-endian bytes, bit i being bucket i
+    owner = models.ForeignKey(
+        User, related_name="availability_masks", on_delete=models.CASCADE
+    )
+    day = models.ForeignKey(
+        Day, related_name="availability_masks", on_delete=models.CASCADE
+    )
+    bits = models.BinaryField(max_length=BUCKETS_PER_DAY // 8)
+
+    class Meta:
+        unique_together = ("owner", "day")
+
+    @property
+    def mask(self):
+        return int.from_bytes(self.bits, "little")
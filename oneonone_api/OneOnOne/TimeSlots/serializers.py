@@ -1,5 +1,8 @@
 from rest_framework import serializers
-from .models import TimeSlot
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
+from .models import TimeSlot, BUCKET_MINUTES, BUCKETS_PER_DAY
+from .intervals import coalesce
 
 
 class TimeSlotSerializer(serializers.ModelSerializer):
@@ -35,5 +38,67 @@ class TimeSlotListSerializer(serializers.ListSerializer):
         fields = ["timeslots"]
 
     def create(self, validated_data):
-        timeslots = [TimeSlot.objects.create(**item) for item in validated_data]
-        return timeslots
+        timeslots, _ = coalesce(TimeSlot(**item) for item in validated_data)
+        return TimeSlot.objects.bulk_create(timeslots)
+
+
+class DayAvailabilitySerializer(serializers.Serializer):
+    day_id = serializers.IntegerField()
+    timeslots = TimeSlotSerializer(many=True)
+
+
+class AvailabilitySerializer(serializers.Serializer):
+    days = DayAvailabilitySerializer(many=True)
+
+
+class DayCoverageSerializer(serializers.Serializer):
+    day_id = serializers.IntegerField(source="id")
+    date = serializers.DateField()
+    ranking = serializers.IntegerField()
+    bucket_minutes = serializers.SerializerMethodField()
+    counts = serializers.ListField(child=serializers.IntegerField())
+
+    def get_bucket_minutes(self, obj) -> int:
+        return BUCKET_MINUTES
+
+
+@extend_schema_field(OpenApiTypes.STR)
+class MaskField(serializers.Field):
+    """
+    Availability bitmask as a hexadecimal string, bit i being the bucket that
+    starts i * BUCKET_MINUTES minutes after midnight.
+    """
+
+    def to_representation(self, value):
+        return format(value, f"0{BUCKETS_PER_DAY // 4}x")
+
+    def to_internal_value(self, data):
+        try:
+            value = int(data, 16)
+        except (TypeError, ValueError):
+            raise serializers.ValidationError("Expected a hexadecimal string.")
+        if value < 0 or value >> BUCKETS_PER_DAY:
+            raise serializers.ValidationError(
+                f"Expected at most {BUCKETS_PER_DAY} bits."
+            )
+        return value
+
+
+class OwnerMaskSerializer(serializers.Serializer):
+    username = serializers.CharField(source="owner.username")
+    mask = MaskField()
+
+
+class DayMasksSerializer(serializers.Serializer):
+    day_id = serializers.IntegerField()
+    bucket_minutes = serializers.IntegerField()
+    masks = OwnerMaskSerializer(many=True)
+    common = MaskField(
+        help_text="Buckets where every participant is available, a participant "
+        "without availability for the day counting as unavailable"
+    )
+    common_minutes = serializers.IntegerField()
+
+
+class MaskUpdateSerializer(serializers.Serializer):
+    mask = MaskField()
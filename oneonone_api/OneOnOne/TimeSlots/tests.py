@@ -0,0 +1,358 @@
+from datetime import date, time
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase
+from rest_framework.test import APITestCase
+from Calendars.models import Calendar, Day, Membership, Participant
+from .coverage import build_counts, mask_intervals, slot_mask
+from .intervals import coalesce
+from .models import AvailabilityMask, DayCoverage, TimeSlot, BUCKET_MINUTES
+
+
+class DayTestCase(APITestCase):
+    """A calendar with one day, its creator and two participants."""
+
+    def setUp(self):
+        self.creator = User.objects.create(username="creator")
+        self.ann = User.objects.create(username="ann")
+        self.bob = User.objects.create(username="bob")
+        self.calendar = Calendar.objects.create(
+            title="Sync", description="", creator=self.creator
+        )
+        Membership.objects.create(
+            user=self.creator, calendar=self.calendar, role="creator"
+        )
+        for user in (self.ann, self.bob):
+            Participant.objects.create(user=user, calendar=self.calendar)
+            Membership.objects.create(
+                user=user, calendar=self.calendar, role="participant"
+            )
+        self.day = Day.objects.create(
+            calendar=self.calendar, date=date(2030, 1, 1), ranking=1
+        )
+        self.url = f"/calendars/{self.calendar.id}/day/{self.day.id}/timeslot/"
+
+    def post_slots(self, user, *bounds):
+        self.client.force_authenticate(user)
+        return self.client.post(
+            self.url,
+            [{"start_time": start, "end_time": end} for start, end in bounds],
+            format="json",
+        )
+
+    def assertCoverageInSync(self):
+        stored = DayCoverage.objects.get(day=self.day).counts
+        self.assertEqual(stored, build_counts([self.day.id])[self.day.id])
+        return stored
+
+
+class CoverageTests(DayTestCase):
+    """The stored day histograms must always match a rebuild from the slots."""
+
+    def test_create_coalesces_overlapping_slots(self):
+        response = self.post_slots(
+            self.ann, ("09:00", "10:00"), ("09:30", "11:00"), ("11:00", "12:00")
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            list(
+                TimeSlot.objects.filter(owner=self.ann).values_list(
+                    "start_time", "end_time"
+                )
+            ),
+            [(time(9), time(12))],
+        )
+        self.assertCoverageInSync()
+
+    def test_create_replaces_the_owners_slots(self):
+        self.assertEqual(self.post_slots(self.ann, ("09:00", "11:00")).status_code, 201)
+        self.post_slots(self.bob, ("10:00", "12:00"))
+        counts = self.assertCoverageInSync()
+        self.assertEqual(counts[10 * 4], 2)
+        self.post_slots(self.ann, ("13:00", "14:00"))
+        counts = self.assertCoverageInSync()
+        self.assertEqual(counts[10 * 4], 1)
+        self.assertEqual(counts[13 * 4], 1)
+
+    def test_update_and_destroy(self):
+        self.post_slots(self.ann, ("09:00", "10:00"), ("11:00", "12:00"))
+        first, second = TimeSlot.objects.filter(owner=self.ann).order_by("start_time")
+        response = self.client.put(
+            f"{self.url}{first.id}/",
+            {"start_time": "09:00", "end_time": "11:00"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(TimeSlot.objects.filter(owner=self.ann).count(), 1)
+        self.assertCoverageInSync()
+        slot = TimeSlot.objects.get(owner=self.ann)
+        self.assertEqual((slot.start_time, slot.end_time), (time(9), time(12)))
+        self.assertEqual(self.client.delete(f"{self.url}{slot.id}/").status_code, 204)
+        self.assertEqual(sum(self.assertCoverageInSync()), 0)
+
+    def test_rejected_create_leaves_slots_alone(self):
+        self.post_slots(self.ann, ("09:00", "10:00"))
+        before = self.assertCoverageInSync()
+        stranger = User.objects.create(username="stranger")
+        self.assertEqual(self.post_slots(stranger, ("09:00", "10:00")).status_code, 403)
+        self.assertEqual(TimeSlot.objects.filter(owner=self.ann).count(), 1)
+        self.assertEqual(self.assertCoverageInSync(), before)
+
+    def test_leaving_the_calendar(self):
+        self.post_slots(self.ann, ("09:00", "10:00"))
+        self.post_slots(self.bob, ("09:00", "10:00"))
+        self.client.force_authenticate(self.ann)
+        response = self.client.delete(f"/calendars/{self.calendar.id}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.assertCoverageInSync()[9 * 4], 1)
+
+
+class CoalesceTests(SimpleTestCase):
+    def slot(self, start, end, owner_id=1, day_id=1):
+        return TimeSlot(
+            owner_id=owner_id,
+            day_id=day_id,
+            start_time=time(*start),
+            end_time=time(*end),
+        )
+
+    def bounds(self, timeslots):
+        return sorted(
+            (timeslot.owner_id, timeslot.start_time, timeslot.end_time)
+            for timeslot in timeslots
+        )
+
+    def test_overlapping_touching_and_disjoint(self):
+        slots = [
+            self.slot((9, 0), (10, 0)),
+            self.slot((9, 30), (11, 0)),
+            self.slot((11, 0), (11, 30)),  # touches the run above
+            self.slot((13, 0), (14, 0)),
+        ]
+        merged, removed = coalesce(slots)
+        self.assertEqual(
+            self.bounds(merged),
+            [(1, time(9), time(11, 30)), (1, time(13), time(14))],
+        )
+        self.assertEqual(len(removed), 2)
+
+    def test_owners_and_days_stay_apart(self):
+        slots = [
+            self.slot((9, 0), (10, 0), owner_id=1),
+            self.slot((9, 0), (10, 0), owner_id=2),
+            self.slot((9, 0), (10, 0), owner_id=1, day_id=2),
+        ]
+        merged, removed = coalesce(slots)
+        self.assertEqual(len(merged), 3)
+        self.assertEqual(removed, [])
+
+    def test_empty_slots_are_removed(self):
+        empty = self.slot((9, 0), (9, 0))
+        merged, removed = coalesce([empty, self.slot((10, 0), (11, 0))])
+        self.assertEqual(removed, [empty])
+        self.assertEqual(len(merged), 1)
+
+    def test_kept_slot_survives_its_run(self):
+        first = self.slot((9, 0), (10, 0))
+        kept = self.slot((9, 30), (12, 0))
+        merged, removed = coalesce([first, kept], keep=[kept])
+        self.assertEqual(merged, [kept])
+        self.assertEqual(removed, [first])
+        self.assertEqual((kept.start_time, kept.end_time), (time(9), time(12)))
+
+
+class MaskTests(DayTestCase):
+    def mask_url(self):
+        return f"/calendars/{self.calendar.id}/day/{self.day.id}/masks/"
+
+    def put_mask(self, user, mask):
+        self.client.force_authenticate(user)
+        return self.client.put(self.mask_url(), {"mask": mask}, format="json")
+
+    def test_slot_mask_round_trip(self):
+        mask = slot_mask(time(9), time(10, 30)) | slot_mask(time(23), time(23, 59))
+        self.assertEqual(mask.bit_count() * BUCKET_MINUTES, 150)
+        self.assertEqual(
+            mask_intervals(mask),
+            [(time(9), time(10, 30)), (time(23), time(23, 59))],
+        )
+        self.assertEqual(mask_intervals(0), [])
+
+    def test_put_mask_replaces_slots(self):
+        mask = format(slot_mask(time(9), time(10)), "024x")
+        self.assertEqual(self.put_mask(self.ann, mask).status_code, 200)
+        self.assertEqual(
+            list(
+                TimeSlot.objects.filter(owner=self.ann).values_list(
+                    "start_time", "end_time"
+                )
+            ),
+            [(time(9), time(10))],
+        )
+        stored = AvailabilityMask.objects.get(owner=self.ann, day=self.day)
+        self.assertEqual(stored.mask, int(mask, 16))
+        self.assertCoverageInSync()
+        # An empty mask clears the day and drops the stored row
+        self.assertEqual(self.put_mask(self.ann, "0" * 24).status_code, 200)
+        self.assertFalse(TimeSlot.objects.filter(owner=self.ann).exists())
+        self.assertFalse(AvailabilityMask.objects.filter(owner=self.ann).exists())
+
+    def test_invalid_masks(self):
+        for mask in ("not hex", "1" + "0" * 24, None):
+            with self.subTest(mask=mask):
+                self.assertEqual(self.put_mask(self.ann, mask).status_code, 400)
+        stranger = User.objects.create(username="stranger")
+        self.assertEqual(self.put_mask(stranger, "0" * 24).status_code, 403)
+
+    def test_common_counts_missing_masks_as_unavailable(self):
+        mask = format(slot_mask(time(9), time(10)), "024x")
+        self.put_mask(self.ann, mask)
+        self.client.force_authenticate(self.creator)
+        data = self.client.get(self.mask_url()).json()
+        self.assertEqual(
+            [(owner["username"], owner["mask"]) for owner in data["masks"]],
+            [("ann", mask), ("bob", "0" * 24)],
+        )
+        self.assertEqual(data["common"], "0" * 24)
+        self.assertEqual(data["common_minutes"], 0)
+
+        self.put_mask(self.bob, format(slot_mask(time(9, 30), time(11)), "024x"))
+        self.client.force_authenticate(self.creator)
+        data = self.client.get(self.mask_url()).json()
+        self.assertEqual(int(data["common"], 16), slot_mask(time(9, 30), time(10)))
+        self.assertEqual(data["common_minutes"], 30)
+
+
+class ETagTests(DayTestCase):
+    def assertChangedBy(self, url, write):
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        write()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_list(self):
+        self.client.force_authenticate(self.ann)
+        self.assertChangedBy(
+            self.url, lambda: self.post_slots(self.bob, ("09:00", "10:00"))
+        )
+
+    def test_detail(self):
+        self.post_slots(self.ann, ("09:00", "10:00"))
+        slot = TimeSlot.objects.get(owner=self.ann)
+
+        def update():
+            response = self.client.put(
+                f"{self.url}{slot.id}/",
+                {"start_time": "09:00", "end_time": "11:00"},
+                format="json",
+            )
+            self.assertEqual(response.status_code, 200)
+
+        self.assertChangedBy(f"{self.url}{slot.id}/", update)
+
+    def test_list_of_a_stranger_has_no_etag(self):
+        self.client.force_authenticate(User.objects.create(username="stranger"))
+        self.assertNotIn("ETag", self.client.get(self.url))
+
+
+class AvailabilityReplaceTests(DayTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_day = Day.objects.create(
+            calendar=self.calendar, date=date(2030, 1, 2), ranking=2
+        )
+        self.availability_url = f"/calendars/{self.calendar.id}/availability/"
+
+    def replace(self, user, days):
+        self.client.force_authenticate(user)
+        return self.client.put(
+            self.availability_url,
+            {
+                "days": [
+                    {
+                        "day_id": day.id,
+                        "timeslots": [
+                            {"start_time": start, "end_time": end}
+                            for start, end in bounds
+                        ],
+                    }
+                    for day, bounds in days
+                ]
+            },
+            format="json",
+        )
+
+    def slots(self, user):
+        return list(
+            TimeSlot.objects.filter(owner=user)
+            .order_by("day__ranking", "start_time")
+            .values_list("day_id", "start_time", "end_time")
+        )
+
+    def assertInSync(self):
+        day_ids = [self.day.id, self.other_day.id]
+        counts = build_counts(day_ids)
+        for coverage in DayCoverage.objects.filter(day_id__in=day_ids):
+            self.assertEqual(coverage.counts, counts[coverage.day_id])
+        for user in (self.ann, self.bob):
+            masks = {
+                mask.day_id: int.from_bytes(mask.bits, "little")
+                for mask in AvailabilityMask.objects.filter(owner=user)
+            }
+            expected = {}
+            for day_id, start_time, end_time in self.slots(user):
+                expected[day_id] = expected.get(day_id, 0) | slot_mask(
+                    start_time, end_time
+                )
+            self.assertEqual(masks, expected)
+
+    def test_missing_days_are_cleared(self):
+        self.replace(
+            self.ann,
+            [
+                (self.day, [("09:00", "10:00")]),
+                (self.other_day, [("13:00", "14:00")]),
+            ],
+        )
+        self.replace(self.bob, [(self.day, [("09:00", "12:00")])])
+        response = self.replace(self.ann, [(self.other_day, [("15:00", "16:00")])])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.slots(self.ann), [(self.other_day.id, time(15), time(16))]
+        )
+        self.assertInSync()
+
+    def test_overlapping_input_is_coalesced(self):
+        bounds = [("09:00", "10:30"), ("10:00", "11:00"), ("11:00", "12:00")]
+        response = self.replace(self.ann, [(self.day, bounds)])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.slots(self.ann), [(self.day.id, time(9), time(12))])
+        self.assertEqual(
+            [slot["start_time"] for slot in response.json()["days"][0]["timeslots"]],
+            ["09:00"],
+        )
+        self.assertInSync()
+
+    def test_day_of_another_calendar_is_rejected(self):
+        self.replace(self.ann, [(self.day, [("09:00", "10:00")])])
+        other = Calendar.objects.create(
+            title="Other", description="", creator=self.ann
+        )
+        foreign = Day.objects.create(calendar=other, date=date(2030, 1, 1), ranking=1)
+        response = self.replace(self.ann, [(foreign, [("13:00", "14:00")])])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.slots(self.ann), [(self.day.id, time(9), time(10))])
+        self.assertInSync()
+
+    def test_non_participant_is_rejected_before_any_write(self):
+        self.replace(self.ann, [(self.day, [("09:00", "10:00")])])
+        version = Calendar.objects.get(id=self.calendar.id).version
+        # The creator is a member but not a participant
+        response = self.replace(self.creator, [(self.day, [("13:00", "14:00")])])
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.slots(self.creator), [])
+        self.assertEqual(Calendar.objects.get(id=self.calendar.id).version, version)
+        self.assertInSync()
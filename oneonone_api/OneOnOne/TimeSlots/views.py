@@ -1,12 +1,40 @@
 from drf_spectacular.utils import extend_schema_view, OpenApiResponse, extend_schema
+from drf_spectacular.utils import OpenApiParameter
 from rest_framework import permissions
 from .serializers import TimeSlotSerializer
 from .models import TimeSlot
 from rest_framework import generics
-from Calendars.models import Day, Participant
+from Calendars.models import Calendar, Day, Participant
+from Calendars.etags import ETagMixin
 from django.shortcuts import get_object_or_404
 from rest_framework.exceptions import PermissionDenied
-from .serializers import TimeSlotListSerializer
+from .serializers import (
+    TimeSlotListSerializer,
+    DayCoverageSerializer,
+    AvailabilitySerializer,
+    DayMasksSerializer,
+    MaskUpdateSerializer,
+)
+from .models import AvailabilityMask, BUCKET_MINUTES, BUCKETS_PER_DAY
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from .coverage import lock_owner_masks, update_coverage, get_coverage, mask_intervals
+from .intervals import coalesce, compact_timeslots
+from rest_framework.response import Response
+from OneOnOne.pagination import StartTimeCursorPagination
+
+
+def day_timeslots(calendar_id, day_id, owner=None):
+    """
+    The timeslots of a day of a calendar with their owners, only those of the
+    username owner when given, in StartTimeCursorPagination's order.
+    """
+    queryset = TimeSlot.objects.filter(
+        day_id=day_id, day__calendar_id=calendar_id
+    ).select_related("owner")
+    if owner:
+        queryset = queryset.filter(owner__username=owner)
+    return queryset.order_by("start_time", "id")
 
 
 @extend_schema_view(
@@ -15,15 +43,25 @@ from .serializers import TimeSlotListSerializer
         responses={201: OpenApiResponse(response=TimeSlotListSerializer)},
     ),
     list=extend_schema(
-        description="List all timeslots",
+        description="List the timeslots of a day",
         request=None,
+        parameters=[
+            OpenApiParameter(
+                "owner", str, description="Only list the timeslots of this username"
+            ),
+            OpenApiParameter(
+                "page_size",
+                int,
+                description="Paginate by start time with this many timeslots per page",
+            ),
+        ],
         responses={200: OpenApiResponse(response=TimeSlotSerializer(many=True))},
     ),
 )
-class TimeSlotListCreateAPIView(generics.ListCreateAPIView):
+class TimeSlotListCreateAPIView(ETagMixin, generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     queryset = TimeSlot.objects.all()
-    pagination_class = None
+    pagination_class = StartTimeCursorPagination
 
     def get_serializer_class(self):
         if self.request.method == "POST":
@@ -31,24 +69,65 @@ class TimeSlotListCreateAPIView(generics.ListCreateAPIView):
         else:
             return TimeSlotSerializer
 
+    def get_queryset(self):
+        return day_timeslots(
+            self.kwargs.get("calendar_id"),
+            self.kwargs.get("day_id"),
+            self.request.query_params.get("owner"),
+        )
+
+    def get_etag_state(self):
+        return (
+            Calendar.objects.filter(
+                pk=self.kwargs.get("calendar_id"),
+                days__id=self.kwargs.get("day_id"),
+                memberships__user=self.request.user,
+            )
+            .values_list("version", flat=True)
+            .first()
+        )
+
+    def list(self, request, *args, **kwargs):
+        day = get_object_or_404(
+            Day.objects.select_related("calendar"),
+            id=self.kwargs.get("day_id"),
+            calendar_id=self.kwargs.get("calendar_id"),
+        )
+        if not day.calendar.has_member(request.user):
+            raise PermissionDenied(
+                "You do not have permission to view the timeslots of this calendar."
+            )
+        return super().list(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         day_id = self.kwargs.get("day_id")
-        day = get_object_or_404(Day, id=day_id)
-
-        # Delete only the timeslots related to the day and owned by the current user
-        TimeSlot.objects.filter(day=day, owner=self.request.user).delete()
+        day = get_object_or_404(
+            Day, id=day_id, calendar_id=self.kwargs.get("calendar_id")
+        )
 
         # Check if the user is a participant of the calendar
         user = self.request.user
         is_participant = Participant.objects.filter(
-            calendar=day.calendar, user=user
+            calendar_id=day.calendar_id, user=user
         ).exists()
         if not is_participant:
             raise PermissionDenied(
                 "You must be a participant of the calendar to create a time slot."
             )
 
-        serializer.save(day=day, owner=user)
+        with transaction.atomic():
+            before = lock_owner_masks(user, [day.id])
+            # Delete only the timeslots related to the day and owned by the current user
+            old_timeslots = TimeSlot.objects.filter(day=day, owner=user)
+            deleted_ids = list(old_timeslots.values_list("id", flat=True))
+            old_timeslots.delete()
+            timeslots = serializer.save(day=day, owner=user)
+            update_coverage(user, before)
+            Calendar.bump_version(
+                day.calendar_id,
+                changed={"timeslot": [timeslot.id for timeslot in timeslots]},
+                deleted={"timeslot": deleted_ids},
+            )
 
 
 @extend_schema_view(
@@ -72,7 +151,9 @@ class TimeSlotListCreateAPIView(generics.ListCreateAPIView):
     methods=["patch"],
     exclude=True,
 )
-class TimeSlotRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class TimeSlotRetrieveUpdateDestroyAPIView(
+    ETagMixin, generics.RetrieveUpdateDestroyAPIView
+):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = TimeSlotSerializer
     queryset = TimeSlot.objects.all()
@@ -85,6 +166,14 @@ class TimeSlotRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView
         user = self.request.user
         return TimeSlot.objects.filter(owner=user)
 
+    def get_etag_state(self):
+        return (
+            self.get_queryset()
+            .filter(pk=self.kwargs["pk"])
+            .values_list("day__calendar__version", flat=True)
+            .first()
+        )
+
     def perform_update(self, serializer):
         """
         Check if the user is the owner of the time slot before updating.
@@ -92,7 +181,25 @@ class TimeSlotRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView
         timeslot = self.get_object()
         if timeslot.owner != self.request.user:
             raise PermissionDenied("You do not have permission to edit this time slot.")
-        serializer.save()
+        with transaction.atomic():
+            before = lock_owner_masks(timeslot.owner, [timeslot.day_id])
+            timeslot = serializer.save()
+            # The new bounds may now overlap or touch the owner's other slots
+            widened, removed = compact_timeslots(
+                [timeslot]
+                + list(
+                    TimeSlot.objects.filter(
+                        day_id=timeslot.day_id, owner_id=timeslot.owner_id
+                    ).exclude(pk=timeslot.pk)
+                ),
+                keep=[timeslot],
+            )
+            update_coverage(timeslot.owner, before)
+            Calendar.bump_version(
+                timeslot.day.calendar_id,
+                changed={"timeslot": {timeslot.pk} | {other.pk for other in widened}},
+                deleted={"timeslot": [other.pk for other in removed]},
+            )
 
     def perform_destroy(self, instance):
         """
@@ -102,4 +209,212 @@ class TimeSlotRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView
             raise PermissionDenied(
                 "You do not have permission to delete this time slot."
             )
-        instance.delete()
+        with transaction.atomic():
+            before = lock_owner_masks(instance.owner, [instance.day_id])
+            timeslot_id = instance.pk
+            instance.delete()
+            update_coverage(instance.owner, before)
+            Calendar.bump_version(
+                instance.day.calendar_id, deleted={"timeslot": [timeslot_id]}
+            )
+
+
+@extend_schema_view(
+    get=extend_schema(
+        description="Number of participants available in each bucket of every day",
+        request=None,
+        responses={200: OpenApiResponse(response=DayCoverageSerializer(many=True))},
+    ),
+)
+class DayCoverageListAPIView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = DayCoverageSerializer
+
+    def get(self, request, *args, **kwargs):
+        calendar = get_object_or_404(Calendar, id=self.kwargs.get("calendar_id"))
+        if not calendar.has_member(request.user):
+            raise PermissionDenied(
+                "You do not have permission to view the availability of this calendar."
+            )
+
+        days = list(calendar.days.all())
+        counts = get_coverage(days)
+        for day in days:
+            day.counts = counts[day.id]
+        serializer = self.get_serializer(days, many=True)
+        return Response(serializer.data)
+
+
+@extend_schema_view(
+    get=extend_schema(
+        description="Retrieve the current user's timeslots for every day of a calendar",
+        request=None,
+        responses={200: OpenApiResponse(response=AvailabilitySerializer)},
+    ),
+    put=extend_schema(
+        description="Replace the current user's timeslots for every day of a calendar",
+        request=AvailabilitySerializer,
+        responses={200: OpenApiResponse(response=AvailabilitySerializer)},
+    ),
+)
+class AvailabilityAPIView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = AvailabilitySerializer
+
+    def get_calendar(self):
+        calendar = get_object_or_404(Calendar, id=self.kwargs.get("calendar_id"))
+        if not Participant.objects.filter(
+            calendar=calendar, user=self.request.user
+        ).exists():
+            raise PermissionDenied(
+                "You must be a participant of the calendar to manage your availability."
+            )
+        return calendar
+
+    def get_availability(self, day_ids):
+        timeslots = {day_id: [] for day_id in day_ids}
+        for timeslot in TimeSlot.objects.filter(
+            day_id__in=day_ids, owner=self.request.user
+        ).order_by("start_time"):
+            timeslot.owner = self.request.user
+            timeslots[timeslot.day_id].append(timeslot)
+        return {
+            "days": [
+                {"day_id": day_id, "timeslots": day_timeslots}
+                for day_id, day_timeslots in timeslots.items()
+            ]
+        }
+
+    def get(self, request, *args, **kwargs):
+        calendar = self.get_calendar()
+        day_ids = list(calendar.days.values_list("id", flat=True))
+        return Response(self.get_serializer(self.get_availability(day_ids)).data)
+
+    def put(self, request, *args, **kwargs):
+        """
+        Days missing from the payload are cleared, so the payload is the
+        user's complete availability for the calendar.
+        """
+        calendar = self.get_calendar()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        day_ids = list(calendar.days.values_list("id", flat=True))
+        days_data = serializer.validated_data["days"]
+        unknown = {day_data["day_id"] for day_data in days_data} - set(day_ids)
+        if unknown:
+            raise ValidationError(
+                {"days": f"Days {sorted(unknown)} do not belong to this calendar."}
+            )
+
+        user = request.user
+        with transaction.atomic():
+            before = lock_owner_masks(user, day_ids)
+            old_timeslots = TimeSlot.objects.filter(day_id__in=day_ids, owner=user)
+            deleted_ids = list(old_timeslots.values_list("id", flat=True))
+            old_timeslots.delete()
+            timeslots, _ = coalesce(
+                TimeSlot(day_id=day_data["day_id"], owner=user, **timeslot_data)
+                for day_data in days_data
+                for timeslot_data in day_data["timeslots"]
+            )
+            TimeSlot.objects.bulk_create(timeslots)
+            update_coverage(user, before)
+            Calendar.bump_version(
+                calendar.pk,
+                changed={"timeslot": [timeslot.id for timeslot in timeslots]},
+                deleted={"timeslot": deleted_ids},
+            )
+
+        return Response(self.get_serializer(self.get_availability(day_ids)).data)
+
+
+@extend_schema_view(
+    get=extend_schema(
+        description="Retrieve every participant's availability bitmask for a day",
+        request=None,
+        responses={200: OpenApiResponse(response=DayMasksSerializer)},
+    ),
+    put=extend_schema(
+        description="Replace the current user's timeslots for a day with a bitmask",
+        request=MaskUpdateSerializer,
+        responses={200: OpenApiResponse(response=MaskUpdateSerializer)},
+    ),
+)
+class AvailabilityMaskAPIView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_serializer_class(self):
+        if self.request.method == "PUT":
+            return MaskUpdateSerializer
+        return DayMasksSerializer
+
+    def get_day(self):
+        return get_object_or_404(
+            Day.objects.select_related("calendar"),
+            id=self.kwargs.get("day_id"),
+            calendar_id=self.kwargs.get("calendar_id"),
+        )
+
+    def get(self, request, *args, **kwargs):
+        day = self.get_day()
+        if not day.calendar.has_member(request.user):
+            raise PermissionDenied(
+                "You do not have permission to view the availability of this calendar."
+            )
+
+        stored = {
+            mask.owner_id: mask.mask
+            for mask in AvailabilityMask.objects.filter(day=day).only("owner", "bits")
+        }
+        # A participant with no mask has given no availability for the day, it
+        # counts as all zero rather than being left out of common
+        masks = [
+            {"owner": participant.user, "mask": stored.get(participant.user_id, 0)}
+            for participant in Participant.objects.filter(calendar_id=day.calendar_id)
+            .select_related("user")
+            .order_by("user__username")
+        ]
+        common = (1 << BUCKETS_PER_DAY) - 1 if masks else 0
+        for mask in masks:
+            common &= mask["mask"]
+        data = {
+            "day_id": day.id,
+            "bucket_minutes": BUCKET_MINUTES,
+            "masks": masks,
+            "common": common,
+            "common_minutes": common.bit_count() * BUCKET_MINUTES,
+        }
+        return Response(self.get_serializer(data).data)
+
+    def put(self, request, *args, **kwargs):
+        day = self.get_day()
+        user = request.user
+        if not Participant.objects.filter(
+            calendar_id=day.calendar_id, user=user
+        ).exists():
+            raise PermissionDenied(
+                "You must be a participant of the calendar to create a time slot."
+            )
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            before = lock_owner_masks(user, [day.id])
+            old_timeslots = TimeSlot.objects.filter(day=day, owner=user)
+            deleted_ids = list(old_timeslots.values_list("id", flat=True))
+            old_timeslots.delete()
+            timeslots = TimeSlot.objects.bulk_create(
+                TimeSlot(day=day, owner=user, start_time=start_time, end_time=end_time)
+                for start_time, end_time in mask_intervals(
+                    serializer.validated_data["mask"]
+                )
+            )
+            update_coverage(user, before)
+            Calendar.bump_version(
+                day.calendar_id,
+                changed={"timeslot": [timeslot.id for timeslot in timeslots]},
+                deleted={"timeslot": deleted_ids},
+            )
+
+        return Response(serializer.data)
@@ -3,5 +3,6 @@
 # Activate the virtual environment
 source venv/bin/activate
 
-# Run the Django development server
-python ./OneOnOne/manage.py runserver
+# Run the development server under ASGI, so the calendar long-polls wait as
+# coroutines on the event loop instead of holding a worker thread each
+python -m uvicorn --app-dir ./OneOnOne --reload --reload-dir ./OneOnOne --host 127.0.0.1 --port 8000 OneOnOne.asgi:application
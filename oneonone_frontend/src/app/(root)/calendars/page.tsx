@@ -54,7 +54,6 @@ export type Calendar = {
 };
 
 export type CalendarApiResponse = {
-  count: number;
   next: string | null;
   previous: string | null;
   results: Calendar[];
@@ -74,7 +73,6 @@ const Calendars = () => {
   const { isLoggedIn, userDetails } = useAuth();
   const queryClient = useQueryClient();
   const router = useRouter();
-  const itemsPerPage = 10;
 
   useEffect(() => {
     if (!isLoggedIn) {
@@ -82,9 +80,14 @@ const Calendars = () => {
     }
   }, [isLoggedIn, router]);
 
-  const fetchCalendars = async ({ pageParam = 1 }) => {
+  // pageParam is the cursor url of the next page returned by the api
+  const fetchCalendars = async ({
+    pageParam,
+  }: {
+    pageParam: string | null;
+  }) => {
     const response = await axiosInstance.get<CalendarApiResponse>(
-      `/calendars/?page=${pageParam}`,
+      pageParam ?? "/calendars/",
     );
     return response.data;
   };
@@ -94,12 +97,8 @@ const Calendars = () => {
       {
         queryKey: ["calendars"],
         queryFn: fetchCalendars,
-        initialPageParam: 1,
-        getNextPageParam: (lastPage, allPages) => {
-          const totalPages = Math.ceil(lastPage.count / itemsPerPage);
-          const nextPage = allPages.length + 1;
-          return nextPage <= totalPages ? nextPage : undefined;
-        },
+        initialPageParam: null as string | null,
+        getNextPageParam: (lastPage) => lastPage.next ?? undefined,
       }, // These are the query options
     );
 
@@ -6,8 +6,13 @@ type Friend = {
   username: string;
 };
 
+// The search endpoint matches prefixes server side, wait for a pause in
+// typing before asking it
+const SEARCH_DELAY_MS = 250;
+const SEARCH_LIMIT = 20;
+
 const AddContacts = () => {
-  const [allUsers, setAllUsers] = useState<Friend[]>([]);
+  const [matchingUsers, setMatchingUsers] = useState<Friend[]>([]);
   const [searchTerm, setSearchTerm] = useState("");
   const [filteredUsers, setFilteredUsers] = useState<Friend[]>([]);
   const [excludedUsernames, setExcludedUsernames] = useState<Set<string>>(
@@ -16,7 +21,6 @@ const AddContacts = () => {
 
   const fetchUsers = async () => {
     try {
-      const searchResponse = await axiosInstance.get("/contacts/search/");
       const friendsResponse = await axiosInstance.get("/contacts/friends/");
       const incomingResponse = await axiosInstance.get("/contacts/incoming/");
       const outgoingResponse = await axiosInstance.get("/contacts/outgoing/");
@@ -25,7 +29,6 @@ const AddContacts = () => {
         ...incomingResponse.data.map((u: Friend) => u.username),
         ...outgoingResponse.data.map((u: Friend) => u.username),
       ]);
-      setAllUsers(searchResponse.data);
       setExcludedUsernames(excludeNames);
     } catch (error) {
       console.error("Error fetching users:", error);
@@ -37,13 +40,34 @@ const AddContacts = () => {
   }, []);
 
   useEffect(() => {
-    const filtered = allUsers.filter(
-      (user) =>
-        user.username.toLowerCase().includes(searchTerm.toLowerCase()) &&
-        !excludedUsernames.has(user.username),
+    if (!searchTerm.trim()) {
+      setMatchingUsers([]);
+      return;
+    }
+    let cancelled = false;
+    const timeout = setTimeout(async () => {
+      try {
+        const response = await axiosInstance.get("/contacts/search/", {
+          params: { q: searchTerm, limit: SEARCH_LIMIT },
+        });
+        if (!cancelled) {
+          setMatchingUsers(response.data);
+        }
+      } catch (error) {
+        console.error("Error searching users:", error);
+      }
+    }, SEARCH_DELAY_MS);
+    return () => {
+      cancelled = true;
+      clearTimeout(timeout);
+    };
+  }, [searchTerm]);
+
+  useEffect(() => {
+    setFilteredUsers(
+      matchingUsers.filter((user) => !excludedUsernames.has(user.username)),
     );
-    setFilteredUsers(filtered);
-  }, [searchTerm, allUsers, excludedUsernames]);
+  }, [matchingUsers, excludedUsernames]);
 
   const handleAdd = async (username: string) => {
     try {
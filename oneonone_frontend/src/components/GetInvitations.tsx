@@ -9,14 +9,27 @@ type Invitation = {
   calendar: string;
 };
 
+type InvitationPage = {
+  next: string | null;
+  results: Invitation[];
+};
+
 const GetInvitations = () => {
   const router = useRouter();
-  const [invitations, setInvitations] = useState([]);
+  const [invitations, setInvitations] = useState<Invitation[]>([]);
 
   const fetchInvitations = async () => {
     try {
-      const response = await axiosInstance.get("/calendars/invitations/");
-      setInvitations(response.data);
+      // The inbox is paginated, follow the cursor so every pending
+      // invitation is shown and not only the first page
+      const pending: Invitation[] = [];
+      let url: string | null = "/calendars/invitations/?page_size=100";
+      while (url) {
+        const page: InvitationPage = (await axiosInstance.get(url)).data;
+        pending.push(...page.results);
+        url = page.next;
+      }
+      setInvitations(pending);
     } catch (error) {
       console.error("Error fetching invitations:", error);
     }